@@ -1,7 +1,8 @@
 import streamlit as st
 import pandas as pd
-import re
-from recommend_module import recommend
+import os
+from recommend_module import Recommender, CACHE_DIR
+from option_tables import unique_values
 
 # إعدادات الصفحة مع دعم اللغة العربية
 st.set_page_config(
@@ -11,39 +12,40 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# تحميل بيانات التخصصات
-@st.cache_data
+# محرك التوصية: يُبنى مرة واحدة لكل عملية خادم ويُشارك بين الجلسات،
+# ويعيد تحميل majors.csv في الخلفية عند تعديله
+@st.cache_resource(show_spinner=False)
+def get_recommender():
+    return Recommender(
+        "majors.csv",
+        query_cache_path=os.path.join(CACHE_DIR, "query_embeddings.sqlite"),
+    ).watch()
+
+# بيانات التخصصات: نفس النسخة التي يقيّم عليها المحرك، فلا يُقرأ الملف مرتين
 def load_data():
     try:
-        return pd.read_csv("majors.csv")
+        return get_recommender().df
     except FileNotFoundError:
         st.error("⚠️ ملف majors.csv غير موجود. يرجى التأكد من وجود الملف في المسار الصحيح.")
         return pd.DataFrame()
 
+catalog_version = get_recommender().version
 df = load_data()
 
 # دعم كامل للغة العربية وتحسين معالجة النصوص
+# version يجعل الخيارات تُحسب من جديد بعد إعادة تحميل الكتالوج
 @st.cache_data
-def extract_unique_values(cols):
-    values = []
-    for col in cols:
-        if col in df.columns and not df.empty:
-            # تنظيف النصوص وفصلها بشكل أفضل
-            column_values = df[col].dropna().astype(str)
-            for value in column_values:
-                # فصل القيم باستخدام فواصل متعددة وتنظيفها
-                separated_values = re.split(r'[،,;؛\n]', value)
-                for v in separated_values:
-                    cleaned_v = v.strip()
-                    if cleaned_v and cleaned_v != 'nan':
-                        values.append(cleaned_v)
-    return sorted(list(set(values)), key=lambda x: x.strip())
+def extract_unique_values(cols, version=0):
+    # نفس المفردات التي بُنيت منها جداول الخيارات في المحرك
+    if df.empty:
+        return []
+    return unique_values(df, cols, get_recommender().catalog_lists(cols))
 
 # الحصول على الخيارات
 if not df.empty:
-    skills_options = extract_unique_values(["skills", "acquired_skills"])
-    interests_options = extract_unique_values(["interests_keywords", "core_subjects"])
-    preferred_fields_options = extract_unique_values(["domain", "name"])
+    skills_options = extract_unique_values(["skills", "acquired_skills"], catalog_version)
+    interests_options = extract_unique_values(["interests_keywords", "core_subjects"], catalog_version)
+    preferred_fields_options = extract_unique_values(["domain", "name"], catalog_version)
 else:
     skills_options = []
     interests_options = []
@@ -336,6 +338,10 @@ with st.sidebar:
     </div>
     """.format(len(df) if not df.empty else 0), unsafe_allow_html=True)
 
+    st.markdown("---")
+    # لوحة تشخيص: زمن كل مرحلة من مراحل التوصية للطلب الحالي
+    debug_mode = st.checkbox("🛠️ عرض تفاصيل الأداء", value=False)
+
 # المحتوى الرئيسي
 st.markdown("<h1 class='main-header'>🎓 نظام توصية التخصصات الجامعية</h1>", unsafe_allow_html=True)
 st.markdown("<div style='text-align: center; font-size: 1.2rem; margin-bottom: 2rem; color: #666;'>الرجاء تعبئة البيانات أدناه للحصول على توصيات مخصصة بناءً على ملفك الشخصي</div>", unsafe_allow_html=True)
@@ -536,11 +542,35 @@ if submit:
                 "grades": {"physics": physics, "chemistry": chemistry, "mathematics": mathematics}
             }
             
-            results = recommend(profile)
+            # جلسة لكل مستخدم: تعديل الدرجات أو المعدل وحده لا يعيد ترميز النصوص
+            if "scoring_session" not in st.session_state:
+                st.session_state.scoring_session = get_recommender().session()
+            session = st.session_state.scoring_session
+            trace = None
+            if debug_mode:
+                results, trace = session.recommend(profile, trace=True)
+            else:
+                results = session.recommend(profile)
         
         # عرض النتائج
         st.markdown("---")
         
+        if trace:
+            with st.expander("🛠️ تفاصيل الأداء", expanded=True):
+                st.metric("الزمن الكلي", f"{trace['total_ms']:.1f} ms")
+                stages = pd.DataFrame({
+                    "المرحلة": list(trace["stages_ms"]),
+                    "الزمن (ms)": [round(v, 3) for v in trace["stages_ms"].values()],
+                }).set_index("المرحلة")
+                st.bar_chart(stages)
+                st.dataframe(stages, use_container_width=True)
+                st.caption("ذاكرة الاستعلامات")
+                st.json(get_recommender().query_cache.stats())
+                st.caption("ذاكرة النتائج")
+                st.json(get_recommender().result_cache.stats())
+                st.caption("المرحلة الدلالية في هذه الجلسة")
+                st.json(session.stats())
+        
         if results is None:
             st.error("""
             **⚠️ لم يتم العثور على نتائج**
@@ -649,3 +679,6 @@ st.markdown("""
     <p>© 2024 نظام توصية التخصصات الجامعية الذكي - جميع الحقوق محفوظة</p>
 </div>
 """, unsafe_allow_html=True)
+
+# تسخين المحرك بعد عرض الصفحة كاملة حتى لا يتأخر أول عرض
+get_recommender().warm_up()
@@ -0,0 +1 @@
+# أدوات قياس أداء التوصية: python -m bench --sizes 64 10000 100000 --out bench.json
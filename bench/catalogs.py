@@ -0,0 +1,33 @@
+import os
+import numpy as np
+import pandas as pd
+
+
+# ---------- تكبير الكتالوج ----------
+# نسخ صفوف majors.csv حتى n_rows مع اسم ومعرّف جديدين لكل نسخة،
+# وتحريك الأعمدة الرقمية قليلًا حتى لا تتطابق النسخ في الترتيب.
+def scale_catalog(df, n_rows, seed=0):
+    rng = np.random.default_rng(seed)
+    source = df.iloc[np.arange(n_rows) % len(df)].reset_index(drop=True)
+    copy = np.arange(n_rows) // len(df)
+    out = source.copy()
+    out["major_id"] = np.arange(1, n_rows + 1)
+    out["name"] = [name if c == 0 else f"{name} {c}" for name, c in zip(source["name"].astype(str), copy)]
+    varied = copy > 0
+    for col, spread, low, high in (("min_highschool_gpa", 5.0, 0, 100), ("automation_risk_score", 5.0, 0, 100)):
+        if col in out.columns:
+            values = pd.to_numeric(out[col], errors="coerce").to_numpy()
+            noise = rng.uniform(-spread, spread, n_rows) * varied
+            out[col] = np.clip(values + noise, low, high).round(2)
+    return out
+
+
+def write_scaled_catalog(path, n_rows, directory, seed=0):
+    df = pd.read_csv(path)
+    if n_rows == len(df):
+        return path
+    os.makedirs(directory, exist_ok=True)
+    out_path = os.path.join(directory, f"majors-{n_rows}.csv")
+    if not os.path.exists(out_path):
+        scale_catalog(df, n_rows, seed).to_csv(out_path, index=False)
+    return out_path
@@ -0,0 +1,42 @@
+import numpy as np
+from option_tables import option_columns, unique_values
+
+career_templates = ["أطمح أن أعمل في {}", "أريد أن أصبح {}", "هدفي العمل في مجال {}"]
+
+
+def option_vocabularies(df):
+    vocab = {key: unique_values(df, cols) for key, cols in option_columns.items()}
+    vocab["career_paths"] = unique_values(df, ["career_paths"])
+    vocab["domains"] = unique_values(df, ["domain"])
+    return vocab
+
+
+def _sample(rng, options, low, high):
+    if not options:
+        return []
+    k = min(int(rng.integers(low, high + 1)), len(options))
+    return [options[i] for i in rng.choice(len(options), k, replace=False)]
+
+
+# ملفات بنفس شكل الملف الذي يبنيه app.py عند الإرسال
+def synthetic_profiles(df, n, seed=0):
+    rng = np.random.default_rng(seed)
+    vocab = option_vocabularies(df)
+    profiles = []
+    for _ in range(n):
+        skills = _sample(rng, vocab["skills"], 0, 5)
+        interests = _sample(rng, vocab["interests"], 0, 5)
+        preferred_fields = _sample(rng, vocab["preferred_fields"], 0, 3)
+        paths = _sample(rng, vocab["career_paths"], 0, 1)
+        career_goal = career_templates[int(rng.integers(len(career_templates)))].format(paths[0]) if paths else ""
+        profiles.append({
+            "about": " ".join(skills + interests + [career_goal] + preferred_fields),
+            "skills": skills,
+            "interests": interests,
+            "career_goal": career_goal,
+            "preferred_fields": preferred_fields,
+            "dislikes": _sample(rng, vocab["domains"], 0, 2),
+            "gpa": round(float(rng.uniform(60, 100)), 1),
+            "grades": {sub: int(rng.integers(50, 101)) for sub in ("physics", "chemistry", "mathematics")},
+        })
+    return profiles
@@ -0,0 +1,160 @@
+import argparse
+import json
+import multiprocessing as mp
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from bench.catalogs import write_scaled_catalog
+from bench.profiles import synthetic_profiles
+
+def peak_rss_mb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # كيلوبايت على لينكس وبايت على macOS
+    return rss / (2**20 if sys.platform == "darwin" else 2**10)
+
+
+def percentiles(samples_ms):
+    samples = np.asarray(samples_ms, dtype=float)
+    if not len(samples):
+        return {}
+    return {
+        "mean": float(samples.mean()),
+        "p50": float(np.percentile(samples, 50)),
+        "p95": float(np.percentile(samples, 95)),
+        "p99": float(np.percentile(samples, 99)),
+        "max": float(samples.max()),
+    }
+
+
+# ---------- تفصيل زمن كل مرحلة ----------
+# من تتبع recommend(trace=True) لكل طلب: نفس المراحل التي تُصدَّر في /metrics
+def stage_summary(traces):
+    stages = {}
+    for trace in traces:
+        for stage, ms in trace["stages_ms"].items():
+            stages.setdefault(stage, []).append(ms)
+    return {stage: percentiles(samples) for stage, samples in stages.items()}
+
+
+# ---------- قياس كتالوج واحد ----------
+def run_size(catalog_path, n_profiles=200, batch_size=64, top_n=7, cache_dir=None, seed=0, options=None):
+    from recommend_module import Recommender
+    options = options or {}
+    profiles = synthetic_profiles(pd.read_csv(catalog_path), n_profiles, seed)
+    cache_dir = cache_dir or tempfile.mkdtemp(prefix="bench-cache-")
+
+    start = time.perf_counter()
+    recommender = Recommender(catalog_path, cache_dir=cache_dir, **options).warm_up()
+    cold_start = time.perf_counter() - start
+    start = time.perf_counter()
+    recommender.recommend(profiles[0], top_n=top_n)
+    first_request = time.perf_counter() - start
+
+    # كل حلقة تقيس التقييم نفسه، لا ذاكرة النتائج
+    recommender.query_cache.clear()
+    recommender.result_cache.clear()
+    latencies, traces = [], []
+    for profile in profiles:
+        start = time.perf_counter()
+        _, trace = recommender.recommend(profile, top_n=top_n, trace=True)
+        latencies.append((time.perf_counter() - start) * 1000)
+        traces.append(trace)
+    query_cache = recommender.query_cache.stats()
+
+    recommender.query_cache.clear()
+    recommender.result_cache.clear()
+    start = time.perf_counter()
+    for i in range(0, len(profiles), batch_size):
+        recommender.recommend_batch(profiles[i:i+batch_size], top_n=top_n)
+    batch_seconds = time.perf_counter() - start
+
+    return {
+        "catalog": catalog_path,
+        "catalog_rows": len(recommender.df),
+        "profiles": len(profiles),
+        "cold_start_s": cold_start,
+        "first_request_s": first_request,
+        "latency_ms": percentiles(latencies),
+        "query_cache_hit_rate": query_cache["hit_rate"],
+        "batch_size": batch_size,
+        "throughput_profiles_per_s": len(profiles) / batch_seconds if batch_seconds else None,
+        "stages_ms": stage_summary(traces),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def _run_isolated(kwargs):
+    return run_size(**kwargs)
+
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+
+# python -m bench --sizes 64 10000 100000 --profiles 200 --out bench.json
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark recommend() on synthetic profiles and scaled catalogs.")
+    parser.add_argument("--catalog", default="majors.csv")
+    parser.add_argument("--sizes", type=int, nargs="*", default=None,
+                        help="catalog sizes to synthesize (default: the catalog as is)")
+    parser.add_argument("--profiles", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--top-n", type=int, default=7)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", default=os.path.join(tempfile.gettempdir(), "recommender-bench"),
+                        help="where scaled catalogs are written")
+    parser.add_argument("--cache-dir", default=None,
+                        help="reuse an embedding cache (default: fresh per size, so cold start includes encoding)")
+    parser.add_argument("--encoder", default=None)
+    parser.add_argument("--vector-index", default=None, choices=["exact", "ivf"])
+    parser.add_argument("--vector-storage", default=None, choices=["float32", "float16", "int8"])
+    parser.add_argument("--in-process", action="store_true",
+                        help="run every size in this process (peak RSS is then cumulative)")
+    parser.add_argument("--out", default=None, help="write the JSON report here (default: stdout)")
+    args = parser.parse_args(argv)
+
+    options = {k: v for k, v in (("encoder", args.encoder), ("vector_index", args.vector_index),
+                                 ("vector_storage", args.vector_storage)) if v is not None}
+    sizes = args.sizes or [len(pd.read_csv(args.catalog))]
+    results = []
+    for size in sizes:
+        kwargs = {
+            "catalog_path": write_scaled_catalog(args.catalog, size, args.workdir, args.seed),
+            "n_profiles": args.profiles, "batch_size": args.batch_size, "top_n": args.top_n,
+            "cache_dir": args.cache_dir, "seed": args.seed, "options": options,
+        }
+        if args.in_process:
+            result = run_size(**kwargs)
+        else:
+            # عملية جديدة لكل حجم: زمن البدء البارد وذروة الذاكرة لا يتأثران بما قبلها
+            with mp.get_context("spawn").Pool(1) as pool:
+                result = pool.apply(_run_isolated, (kwargs,))
+        results.append(result)
+        print(f"{result['catalog_rows']:>7} rows: cold {result['cold_start_s']:.2f}s, "
+              f"p50 {result['latency_ms']['p50']:.1f}ms, p99 {result['latency_ms']['p99']:.1f}ms, "
+              f"{result['throughput_profiles_per_s']:.0f} profiles/s, rss {result['peak_rss_mb']:.0f} MiB",
+              file=sys.stderr)
+
+    report = json.dumps({"environment": environment(), "options": options, "results": results},
+                        indent=2, ensure_ascii=False)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(report)
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
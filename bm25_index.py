@@ -0,0 +1,176 @@
+import re
+import sys
+import numpy as np
+from scipy import sparse
+from shared_arrays import load_arrays, load_json, save_arrays, save_json
+
+# ---------- تقطيع النص العربي ----------
+# التشكيل والتطويل
+_DIACRITICS = re.compile(r"[\u0610-\u061A\u064B-\u065F\u0670\u06D6-\u06ED\u0640]")
+# توحيد أشكال الألف والياء والتاء المربوطة
+_LETTER_MAP = str.maketrans({"أ": "ا", "إ": "ا", "آ": "ا", "ٱ": "ا", "ى": "ي", "ة": "ه"})
+# كل ما ليس حرفًا أو رقمًا فاصل: المسافات وعلامات الترقيم و ; و ، و ؛
+_TOKEN = re.compile(r"[^\W_]+")
+
+
+def normalize_arabic(text):
+    return _DIACRITICS.sub("", str(text)).translate(_LETTER_MAP).lower()
+
+
+def tokenize(text):
+    return _TOKEN.findall(normalize_arabic(text))
+
+
+def whitespace_tokenize(text):
+    return str(text).split()
+
+
+# ---------- فهرس BM25 كمصفوفة متناثرة (مصطلح × تخصص) ----------
+# نفس صيغة BM25Okapi (k1 و b و IDF مع استبدال القيم السالبة بـ epsilon * متوسط IDF)،
+# لكن الأوزان محسوبة مسبقًا فيصبح تقييم أي مجموعة استعلامات ضربًا متناثرًا واحدًا.
+class BM25Index:
+    def __init__(self, corpus, tokenizer=tokenize, k1=1.5, b=0.75, epsilon=0.25):
+        self.tokenizer = tokenizer
+        self.k1 = k1
+        self.b = b
+        self.epsilon = epsilon
+
+        self.vocab = {}
+        self.n_docs = len(corpus)
+        # تكرار المصطلحات في كل تخصص (تخصص × مصطلح)
+        self.term_freqs = self._count_terms(self.vocab, corpus)
+        self.doc_len = np.asarray(self.term_freqs.sum(axis=1)).ravel()
+        self.doc_freqs = np.bincount(self.term_freqs.indices, minlength=len(self.vocab))
+        self._compute_weights()
+
+    # يضيف المصطلحات الجديدة إلى vocab ويعيد مصفوفة التكرارات (مستند × مصطلح)
+    def _count_terms(self, vocab, docs):
+        rows, cols, counts = [], [], []
+        for doc_id, doc in enumerate(docs):
+            freqs = {}
+            for token in self.tokenizer(doc):
+                term = vocab.setdefault(token, len(vocab))
+                freqs[term] = freqs.get(term, 0) + 1
+            rows.extend([doc_id] * len(freqs))
+            cols.extend(freqs.keys())
+            counts.extend(freqs.values())
+        return sparse.csr_matrix((np.asarray(counts, dtype=np.float64), (rows, cols)),
+                                 shape=(len(docs), len(vocab)))
+
+    # ---------- تحديث تزايدي ----------
+    # sources[i]: رقم المستند القديم في الموضع i من الفهرس الجديد، أو -1 لنص جديد يؤخذ من texts بالترتيب.
+    # لا يُقطَّع إلا النص الجديد؛ تكرار المصطلحات في المستندات يُعدّ من المصفوفة الجديدة
+    # (قد يتكرر مصدر واحد في عدة مواضع)، ثم يُعاد حساب avgdl و IDF والأوزان. يعيد فهرسًا جديدًا ولا يغيّر الحالي أثناء استخدامه.
+    def with_documents(self, sources, texts):
+        sources = np.asarray(sources, dtype=np.int64)
+        vocab = dict(self.vocab)
+        fresh = self._count_terms(vocab, texts)
+        n_terms = len(vocab)
+        kept = sources[sources >= 0]
+        old = self.term_freqs[kept]
+        old.resize((len(kept), n_terms))
+        order = np.empty(len(sources), dtype=np.int64)
+        order[sources >= 0] = np.arange(len(kept))
+        order[sources < 0] = len(kept) + np.arange(len(texts))
+
+        index = self.__class__.__new__(self.__class__)
+        index.tokenizer, index.k1, index.b, index.epsilon = self.tokenizer, self.k1, self.b, self.epsilon
+        index.vocab = vocab
+        index.n_docs = len(sources)
+        index.term_freqs = sparse.vstack([old, fresh], format="csr")[order]
+        fresh_len = np.asarray(fresh.sum(axis=1)).ravel()
+        index.doc_len = np.concatenate([np.asarray(self.doc_len)[kept], fresh_len])[order]
+        index.doc_freqs = np.bincount(index.term_freqs.indices, minlength=n_terms)
+        index._compute_weights()
+        return index
+
+    def _compute_weights(self):
+        n = self.n_docs
+        self.avgdl = self.doc_len.sum() / n if n else 0.0
+        idf = np.log(n - self.doc_freqs + 0.5) - np.log(self.doc_freqs + 0.5)
+        # المتوسط على المصطلحات الموجودة فعلًا؛ مصطلحات المستندات المحذوفة تبقى في vocab بلا أوزان
+        present = self.doc_freqs > 0
+        average_idf = idf[present].sum() / present.sum() if present.any() else 0.0
+        self.idf = np.where(idf < 0, self.epsilon * average_idf, idf)
+
+        tf = self.term_freqs.tocoo()
+        norm = self.k1 * (1 - self.b + self.b * self.doc_len / self.avgdl) if self.avgdl else np.full(n, self.k1)
+        data = self.idf[tf.col] * tf.data * (self.k1 + 1) / (tf.data + norm[tf.row])
+        # الأوزان (مصطلح × تخصص)
+        self.weights = sparse.csr_matrix((data, (tf.col, tf.row)), shape=(len(self.vocab), n))
+
+    def save(self, directory, prefix="bm25"):
+        save_arrays(directory, prefix, {
+            "weights_data": self.weights.data, "weights_indices": self.weights.indices,
+            "weights_indptr": self.weights.indptr,
+            "tf_data": self.term_freqs.data, "tf_indices": self.term_freqs.indices,
+            "tf_indptr": self.term_freqs.indptr,
+            "doc_len": self.doc_len, "doc_freqs": self.doc_freqs, "idf": self.idf,
+        })
+        save_json(directory, prefix, {
+            "vocab": sorted(self.vocab, key=self.vocab.get), "tokenizer": self.tokenizer.__name__,
+            "k1": self.k1, "b": self.b, "epsilon": self.epsilon, "avgdl": self.avgdl, "n_docs": self.n_docs,
+        })
+
+    @classmethod
+    def load(cls, directory, prefix="bm25", tokenizer=None):
+        meta = load_json(directory, prefix)
+        a = load_arrays(directory, prefix, ("weights_data", "weights_indices", "weights_indptr",
+                                            "tf_data", "tf_indices", "tf_indptr",
+                                            "doc_len", "doc_freqs", "idf"))
+        index = cls.__new__(cls)
+        index.tokenizer = tokenizer or globals()[meta["tokenizer"]]
+        index.k1, index.b, index.epsilon = meta["k1"], meta["b"], meta["epsilon"]
+        index.avgdl, index.n_docs = meta["avgdl"], meta["n_docs"]
+        index.vocab = {t: i for i, t in enumerate(meta["vocab"])}
+        index.doc_len, index.doc_freqs, index.idf = a["doc_len"], a["doc_freqs"], a["idf"]
+        index.weights = sparse.csr_matrix((a["weights_data"], a["weights_indices"], a["weights_indptr"]),
+                                          shape=(len(index.vocab), index.n_docs), copy=False)
+        index.term_freqs = sparse.csr_matrix((a["tf_data"], a["tf_indices"], a["tf_indptr"]),
+                                             shape=(index.n_docs, len(index.vocab)), copy=False)
+        return index
+
+    def query_matrix(self, token_lists):
+        # صف لكل مجموعة استعلامات؛ تكرار الكلمة يُحتسب كما في get_scores
+        rows, cols = [], []
+        for row, tokens in enumerate(token_lists):
+            for token in tokens:
+                term = self.vocab.get(token)
+                if term is not None:
+                    rows.append(row)
+                    cols.append(term)
+        return sparse.csr_matrix((np.ones(len(rows)), (rows, cols)),
+                                 shape=(len(token_lists), len(self.vocab)))
+
+    def score_matrix(self, token_lists):
+        return np.asarray((self.query_matrix(token_lists) @ self.weights).todense())
+
+    def get_scores(self, query):
+        tokens = self.tokenizer(query) if isinstance(query, str) else query
+        return self.score_matrix([tokens])[0]
+
+
+# ---------- التحقق من التطابق مع rank_bm25 ----------
+# python bm25_index.py majors.csv
+def compare_with_okapi(corpus, queries, tokenizer=tokenize):
+    from rank_bm25 import BM25Okapi
+    index = BM25Index(corpus, tokenizer)
+    okapi = BM25Okapi([tokenizer(doc) for doc in corpus])
+    worst = 0.0
+    for q in queries:
+        tokens = tokenizer(q)
+        worst = max(worst, float(np.abs(index.get_scores(tokens) - okapi.get_scores(tokens)).max()))
+    return worst
+
+
+if __name__ == "__main__":
+    from recommend_module import catalog_texts, load_catalog
+    catalog = load_catalog(sys.argv[1] if len(sys.argv) > 1 else "majors.csv")
+    corpus = catalog_texts(catalog).tolist()
+    queries = catalog["name"].astype(str).tolist() + catalog["skills"].fillna("").astype(str).tolist()
+    for name, tok in (("arabic", tokenize), ("whitespace", whitespace_tokenize)):
+        diff = compare_with_okapi(corpus, queries, tok)
+        ok = diff < 1e-9
+        print(f"{name}: max |score - BM25Okapi| = {diff:.2e}", "OK" if ok else "MISMATCH")
+        if not ok:
+            sys.exit(1)
@@ -0,0 +1,294 @@
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import time
+from collections import deque
+from recommend_module import Recommender, subjects
+from service import _plain, to_json, validate_profile
+
+list_fields = ("skills", "interests", "preferred_fields", "dislikes", "preferred_job_sectors", "preferred_domains")
+text_fields = ("about", "career_goal", "track")
+# أعمدة ملف CSV الناتج: صف لكل توصية
+result_fields = ["major_id", "name", "domain", "job_sectors", "study_duration_years", "min_highschool_gpa",
+                 "automation_risk_score", "score", "description", "skills_required"]
+
+
+# ---------- قراءة الملفات الشخصية سطرًا سطرًا ----------
+# كل سجل: (المعرّف، الملف الشخصي، رسالة الخطأ أو None). skip يتخطى السجلات الأولى
+# دون تحليلها (للاستئناف). المعرّف من id_field إن وُجد، وإلا رقم السجل.
+def read_jsonl(stream, id_field="id", skip=0):
+    n = 0
+    for line in stream:
+        if not line.strip():
+            continue
+        n += 1
+        if n <= skip:
+            continue
+        record_id = n
+        try:
+            profile = json.loads(line)
+            if not isinstance(profile, dict):
+                raise ValueError("profile must be a JSON object")
+            record_id = profile.pop(id_field, n)
+            validate_profile(profile)
+        except ValueError as exc:
+            yield record_id, None, str(exc)
+            continue
+        yield record_id, profile, None
+
+
+# أعمدة CSV: about و career_goal و track نصوص، وحقول القوائم مفصولة بـ list_sep،
+# و gpa رقم، والدرجات عمود لكل مادة (أو عمود grades بصيغة JSON)
+def read_csv(stream, id_field="id", list_sep="|", skip=0):
+    for n, row in enumerate(csv.DictReader(stream), 1):
+        if n <= skip:
+            continue
+        try:
+            profile = _csv_profile(row, list_sep)
+        except ValueError as exc:
+            yield row.get(id_field) or n, None, str(exc)
+            continue
+        yield row.get(id_field) or n, profile, None
+
+
+def _csv_profile(row, list_sep):
+    profile = {}
+    for field in text_fields:
+        if (row.get(field) or "").strip():
+            profile[field] = row[field].strip()
+    for field in list_fields:
+        if row.get(field):
+            profile[field] = [v.strip() for v in row[field].split(list_sep) if v.strip()]
+    if (row.get("gpa") or "").strip():
+        profile["gpa"] = _number(row["gpa"], "gpa")
+    grades = json.loads(row["grades"]) if (row.get("grades") or "").strip() else {}
+    for subject in subjects:
+        if (row.get(subject) or "").strip():
+            grades[subject] = _number(row[subject], subject)
+    if grades:
+        profile["grades"] = grades
+    return validate_profile(profile)
+
+
+def _number(text, field):
+    try:
+        return float(text)
+    except ValueError:
+        raise ValueError(f"{field} is not a number: {text!r}")
+
+
+# ---------- الكتابة ----------
+class JsonlWriter:
+    header = b""
+
+    def rows(self, record_id, results, error):
+        if error is not None:
+            return to_json({"id": record_id, "error": error}) + b"\n"
+        return to_json({"id": record_id, "results": results}) + b"\n"
+
+
+class CsvWriter:
+    def __init__(self):
+        self.header = self._encode(["id", "rank", *result_fields, "error"])
+
+    def rows(self, record_id, results, error):
+        if error is not None:
+            return self._encode([record_id, "", *[""] * len(result_fields), error])
+        return b"".join(self._encode([record_id, rank, *(_plain(item.get(f)) for f in result_fields), ""])
+                        for rank, item in enumerate(results, 1))
+
+    def _encode(self, values):
+        buf = io.StringIO()
+        csv.writer(buf).writerow(["" if v is None else v for v in values])
+        return buf.getvalue().encode("utf-8")
+
+
+# ---------- نقطة الاستئناف ----------
+# تُكتب بعد كل دفعة: عدد السجلات المكتملة وطول الملف الناتج عندها.
+# عند الاستئناف يُقص الناتج إلى ذلك الطول (ما كُتب بعدها ناقص) وتُتخطى السجلات المكتملة.
+def load_checkpoint(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def save_checkpoint(path, state):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+
+# ---------- التقييم ----------
+# في العملية نفسها: دفعة بعد دفعة عبر recommend_batch. إن فشلت دفعة يُقيَّم كل ملف
+# وحده حتى لا يُسقط ملف معيب الدفعة كلها؛ الفاشل يعود كاستثناء ويُكتب كخطأ.
+def score_in_process(recommender, profiles, chunk_size, params):
+    chunk = []
+    for profile in profiles:
+        chunk.append(profile)
+        if len(chunk) == chunk_size:
+            yield from _score_chunk(recommender, chunk, params)
+            chunk = []
+    if chunk:
+        yield from _score_chunk(recommender, chunk, params)
+
+
+def _score_chunk(recommender, chunk, params):
+    try:
+        return recommender.recommend_batch(chunk, **params)
+    except Exception:
+        results = []
+        for profile in chunk:
+            try:
+                results.append(recommender.recommend(profile, **params))
+            except Exception as exc:
+                results.append(exc)
+        return results
+
+
+class Progress:
+    def __init__(self, every, done=0):
+        self.every = every
+        self.start = self.last = time.monotonic()
+        self.first = self.last_done = done
+
+    def update(self, done, errors, final=False):
+        now = time.monotonic()
+        if not final and now - self.last < self.every:
+            return
+        rate = (done - self.first) / (now - self.start) if now > self.start else 0.0
+        recent = (done - self.last_done) / (now - self.last) if now > self.last else 0.0
+        print(f"{done} profiles, {errors} errors, {rate:.1f}/s overall, {recent:.1f}/s recent",
+              file=sys.stderr, flush=True)
+        self.last, self.last_done = now, done
+
+
+# python bulk_recommend.py students.jsonl --out recommendations.jsonl --workers 4
+# cat students.csv | python bulk_recommend.py - --format csv --out recommendations.csv
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score a stream of student profiles and write recommendations.")
+    parser.add_argument("input", help="JSONL or CSV file of profiles, or - for stdin")
+    parser.add_argument("--out", default="-", help="output file (.jsonl or .csv), or - for stdout")
+    parser.add_argument("--format", choices=["jsonl", "csv"], default=None,
+                        help="input format (default: from the file extension, jsonl for stdin)")
+    parser.add_argument("--output-format", choices=["jsonl", "csv"], default=None)
+    parser.add_argument("--id-field", default="id")
+    parser.add_argument("--list-sep", default="|", help="separator of list fields in CSV input")
+    parser.add_argument("--catalog", default="majors.csv")
+    parser.add_argument("--encoder", default=None)
+    parser.add_argument("--top-n", type=int, default=7)
+    parser.add_argument("--alpha", type=float, default=0.6)
+    parser.add_argument("--beta", type=float, default=0.35)
+    parser.add_argument("--gamma", type=float, default=0.1)
+    parser.add_argument("--chunk-size", type=int, default=256)
+    parser.add_argument("--workers", type=int, default=1, help="worker processes (1: score in this process)")
+    parser.add_argument("--torch-threads", type=int, default=1)
+    parser.add_argument("--checkpoint", default=None, help="checkpoint file (default: <out>.checkpoint)")
+    parser.add_argument("--resume", action="store_true", help="continue from the checkpoint")
+    parser.add_argument("--progress-every", type=float, default=10.0, help="seconds between progress lines")
+    args = parser.parse_args(argv)
+
+    in_format = args.format or ("csv" if args.input.lower().endswith(".csv") else "jsonl")
+    out_format = args.output_format or ("csv" if args.out.lower().endswith(".csv") else "jsonl")
+    writer = CsvWriter() if out_format == "csv" else JsonlWriter()
+    to_stdout = args.out == "-"
+    checkpoint = None if to_stdout else (args.checkpoint or f"{args.out}.checkpoint")
+    if args.resume and to_stdout:
+        parser.error("--resume needs --out")
+
+    state = load_checkpoint(checkpoint) if args.resume else None
+    if state is None:
+        state = {"input": args.input, "records": 0, "errors": 0, "output_bytes": 0}
+        out = sys.stdout.buffer if to_stdout else open(args.out, "wb")
+        out.write(writer.header)
+    else:
+        out = open(args.out, "r+b")
+        out.truncate(state["output_bytes"])
+        out.seek(0, os.SEEK_END)
+        print(f"resuming after {state['records']} profiles", file=sys.stderr)
+
+    stream = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8", newline="")
+    if in_format == "csv":
+        records = read_csv(stream, args.id_field, args.list_sep, state["records"])
+    else:
+        records = read_jsonl(stream, args.id_field, state["records"])
+
+    # السجلات المقروءة بانتظار نتائجها بالترتيب؛ المعيبة لا تُرسل للتقييم وتُكتب في مكانها
+    waiting = deque()
+
+    def profiles():
+        for record_id, profile, error in records:
+            waiting.append((record_id, error))
+            if error is None:
+                yield profile
+
+    params = {"top_n": args.top_n, "alpha": args.alpha, "beta": args.beta, "gamma": args.gamma}
+    options = {"encoder": args.encoder} if args.encoder else {}
+    recommender = Recommender(args.catalog, **options).warm_up()
+    pool = None
+    if args.workers > 1:
+        from worker_pool import WorkerPool
+        pool = WorkerPool(recommender, workers=args.workers, chunk_size=args.chunk_size,
+                          torch_threads=args.torch_threads, **options)
+        results = pool.imap(profiles(), **params)
+    else:
+        results = score_in_process(recommender, profiles(), args.chunk_size, params)
+
+    progress = Progress(args.progress_every, state["records"])
+    since_checkpoint = 0
+
+    def emit(record_id, result, error):
+        nonlocal since_checkpoint
+        out.write(writer.rows(record_id, result, error))
+        state["records"] += 1
+        state["errors"] += error is not None
+        since_checkpoint += 1
+        if since_checkpoint >= args.chunk_size:
+            commit()
+
+    def commit():
+        nonlocal since_checkpoint
+        out.flush()
+        if checkpoint:
+            os.fsync(out.fileno())
+            state["output_bytes"] = out.tell()
+            save_checkpoint(checkpoint, state)
+        since_checkpoint = 0
+        progress.update(state["records"], state["errors"])
+
+    try:
+        for result in results:
+            while waiting[0][1] is not None:
+                record_id, error = waiting.popleft()
+                emit(record_id, None, error)
+            record_id, _ = waiting.popleft()
+            if isinstance(result, Exception):
+                emit(record_id, None, f"{type(result).__name__}: {result}")
+            else:
+                emit(record_id, result, None)
+        while waiting:
+            record_id, error = waiting.popleft()
+            emit(record_id, None, error)
+        commit()
+    finally:
+        if pool is not None:
+            pool.close()
+        if stream is not sys.stdin:
+            stream.close()
+        if not to_stdout:
+            out.close()
+
+    progress.update(state["records"], state["errors"], final=True)
+    if pool is None:
+        print(f"result cache: {recommender.result_cache.stats()['hit_rate']:.1%} hit rate", file=sys.stderr)
+    if checkpoint and os.path.exists(checkpoint):
+        os.remove(checkpoint)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+import sys
+import numpy as np
+import pandas as pd
+from shared_arrays import load_arrays, load_json, save_arrays, save_json
+
+
+def _missing(value):
+    return value is None or (not isinstance(value, str) and pd.isna(value))
+
+
+# ---------- أعمدة العرض بتمثيل مضغوط ----------
+# الأرقام مصفوفة متصلة؛ النصوص المتكررة (المجال، القطاعات) رموز مع جدول قيم مشتركة،
+# والنصوص الطويلة (الوصف، المهارات) بايتات UTF-8 متتالية مع مواضع البداية،
+# فلا يُنشأ كائن نصي إلا للصف المعروض.
+class NumericColumn:
+    __slots__ = ("values",)
+
+    def __init__(self, values):
+        self.values = values
+
+    def __getitem__(self, i):
+        return self.values[i].item()
+
+    def arrays(self):
+        return {"values": self.values}
+
+
+class CategoryColumn:
+    __slots__ = ("codes", "values")
+
+    def __init__(self, codes, values):
+        self.codes = codes
+        self.values = values
+
+    @classmethod
+    def build(cls, items):
+        position, values = {}, []
+        codes = np.empty(len(items), dtype=np.int32)
+        for i, item in enumerate(items):
+            if _missing(item):
+                codes[i] = -1
+                continue
+            item = str(item)
+            code = position.get(item)
+            if code is None:
+                code = position[item] = len(values)
+                values.append(sys.intern(item))
+            codes[i] = code
+        return cls(codes, values)
+
+    def __getitem__(self, i):
+        code = self.codes[i]
+        return None if code < 0 else self.values[code]
+
+    def arrays(self):
+        return {"codes": self.codes}
+
+
+class StringColumn:
+    __slots__ = ("data", "offsets", "nulls")
+
+    def __init__(self, data, offsets, nulls):
+        self.data = data
+        self.offsets = offsets
+        self.nulls = nulls
+
+    @classmethod
+    def build(cls, items):
+        encoded = [None if _missing(item) else str(item).encode("utf-8") for item in items]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(e) if e else 0 for e in encoded], out=offsets[1:])
+        data = np.frombuffer(b"".join(e for e in encoded if e), dtype=np.uint8)
+        return cls(data, offsets, np.array([e is None for e in encoded], dtype=bool))
+
+    def __getitem__(self, i):
+        if self.nulls[i]:
+            return None
+        return self.data[self.offsets[i]:self.offsets[i+1]].tobytes().decode("utf-8")
+
+    def arrays(self):
+        return {"data": self.data, "offsets": self.offsets, "nulls": self.nulls}
+
+
+_kinds = {"numeric": NumericColumn, "category": CategoryColumn, "string": StringColumn}
+
+
+# عرض صف واحد دون نسخ: القيم تُقرأ من الأعمدة عند الطلب
+class MajorRecord:
+    __slots__ = ("records", "row")
+
+    def __init__(self, records, row):
+        self.records = records
+        self.row = row
+
+    def get(self, name, default=None):
+        column = self.records.columns.get(name)
+        return default if column is None else column[self.row]
+
+    def __getitem__(self, name):
+        return self.records.columns[name][self.row]
+
+
+# ---------- حقول العرض للكتالوج ----------
+# النص الذي تقل قيمه المختلفة عن ربع الصفوف يُرمَّز كفئات، وغيره يُخزَّن كبايتات
+class CatalogRecords:
+    def __init__(self, columns, length):
+        self.columns = columns
+        self.length = length
+
+    @classmethod
+    def build(cls, df, names):
+        columns = {}
+        for name in names:
+            if name not in df.columns:
+                continue
+            series = df[name]
+            if pd.api.types.is_numeric_dtype(series):
+                columns[name] = NumericColumn(np.ascontiguousarray(series.to_numpy()))
+            elif series.nunique() <= len(series) // 4:
+                columns[name] = CategoryColumn.build(series.tolist())
+            else:
+                columns[name] = StringColumn.build(series.tolist())
+        return cls(columns, len(df))
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, row):
+        return MajorRecord(self, row)
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for column in self.columns.values() for a in column.arrays().values())
+
+    def save(self, directory, prefix="records"):
+        arrays, meta = {}, {"length": self.length, "columns": {}}
+        for name, column in self.columns.items():
+            kind = next(k for k, cls in _kinds.items() if isinstance(column, cls))
+            meta["columns"][name] = {"kind": kind, "values": column.values if kind == "category" else None}
+            arrays.update({f"{name}.{part}": a for part, a in column.arrays().items()})
+        save_arrays(directory, prefix, arrays)
+        save_json(directory, prefix, meta)
+
+    @classmethod
+    def load(cls, directory, prefix="records"):
+        meta = load_json(directory, prefix)
+        columns = {}
+        for name, info in meta["columns"].items():
+            kind = info["kind"]
+            if kind == "numeric":
+                columns[name] = NumericColumn(load_arrays(directory, prefix, (f"{name}.values",))[f"{name}.values"])
+            elif kind == "category":
+                codes = load_arrays(directory, prefix, (f"{name}.codes",))[f"{name}.codes"]
+                columns[name] = CategoryColumn(codes, [sys.intern(v) for v in info["values"]])
+            else:
+                a = load_arrays(directory, prefix, (f"{name}.data", f"{name}.offsets", f"{name}.nulls"))
+                columns[name] = StringColumn(a[f"{name}.data"], a[f"{name}.offsets"], a[f"{name}.nulls"])
+        return cls(columns, meta["length"])
@@ -0,0 +1,50 @@
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+# ---------- مراقبة ملف الكتالوج ----------
+# فحص دوري لوقت التعديل والحجم (بلا اعتماديات إضافية). لا يُعاد التحميل إلا بعد أن
+# يثبت التوقيع فحصين متتاليين، حتى لا يُقرأ ملف ما زال يُكتب.
+class CatalogWatcher:
+    def __init__(self, recommender, interval=2.0):
+        self.recommender = recommender
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        self.reloads = 0
+        self.last_error = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="catalog-watcher", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def _run(self):
+        from recommend_module import file_signature
+        pending = None
+        while not self._stop.wait(self.interval):
+            signature = file_signature(self.recommender.catalog_path)
+            if signature is None or signature == self.recommender._signature:
+                pending = None
+                continue
+            if signature != pending:
+                pending = signature
+                continue
+            try:
+                if self.recommender.reload():
+                    self.reloads += 1
+                    logger.info("catalog reloaded: version %d", self.recommender.version)
+                self.last_error = None
+            except Exception as exc:
+                # ملف غير صالح: تبقى النسخة الحالية وتُعاد المحاولة عند التعديل التالي
+                self.last_error = repr(exc)
+                logger.exception("catalog reload failed, keeping version %d", self.recommender.version)
+                self.recommender._signature = signature
+            pending = None
@@ -0,0 +1,222 @@
+import argparse
+import os
+import shutil
+import sys
+import numpy as np
+import pandas as pd
+from facet_index import split_values
+from shared_arrays import load_arrays, load_json, load_strings, save_arrays, save_json, save_strings
+
+FORMAT_VERSION = 1
+MANIFEST = "manifest.json"
+# أعمدة القوائم (عناصر مفصولة بـ ;) التي تُخزَّن عناصرها مفصولة مسبقًا
+list_cols = ["core_subjects", "interests_keywords", "skills", "acquired_skills", "career_paths", "job_sectors"]
+
+
+class CatalogError(ValueError):
+    def __init__(self, problems):
+        super().__init__("invalid catalog:\n" + "\n".join(f"  - {p}" for p in problems))
+        self.problems = problems
+
+
+def is_compiled(path):
+    return os.path.isfile(os.path.join(path, MANIFEST))
+
+
+def _rows(mask, limit=10):
+    rows = (np.flatnonzero(mask) + 2).tolist()  # +2: سطر العناوين والترقيم من 1 كما في محرر الجداول
+    return ", ".join(map(str, rows[:limit])) + (f" (+{len(rows) - limit} more)" if len(rows) > limit else "")
+
+
+# ---------- التحقق من الملف عند البناء ----------
+# الأخطاء توقف البناء، والتحذيرات تُطبع فقط (القيم الناقصة تُعامل كصفر كما في التشغيل).
+def validate(raw):
+    from recommend_module import num_cols, subjects, text_cols
+    problems, warnings = [], []
+    df = raw.copy()
+
+    unnamed = [c for c in df.columns if str(c).startswith("Unnamed:")]
+    empty = [c for c in unnamed if df[c].isna().all()]
+    if empty:
+        warnings.append(f"dropped {len(empty)} empty unnamed columns")
+    for c in sorted(set(unnamed) - set(empty)):
+        problems.append(f"column {c!r} has values but no header")
+    df = df.drop(columns=empty)
+
+    missing = [col for col in ("major_id", "name") if col not in df.columns]
+    if missing:
+        raise CatalogError(problems + [f"missing required column {col!r}" for col in missing])
+
+    ids = pd.to_numeric(df["major_id"], errors="coerce")
+    if ids.isna().any() or (ids != ids.round()).any():
+        problems.append(f"major_id is missing or not an integer on rows {_rows(ids.isna() | (ids != ids.round()))}")
+    elif ids.duplicated().any():
+        problems.append(f"duplicate major_id on rows {_rows(ids.duplicated(keep=False))}")
+    else:
+        df["major_id"] = ids.astype(np.int64)
+    blank = df["name"].isna() | (df["name"].astype(str).str.strip() == "")
+    if blank.any():
+        problems.append(f"empty name on rows {_rows(blank)}")
+
+    for col in text_cols:
+        if col not in df.columns:
+            warnings.append(f"missing text column {col!r} (treated as empty)")
+    for col in num_cols:
+        if col not in df.columns:
+            warnings.append(f"missing numeric column {col!r} (treated as 0)")
+            continue
+        values = pd.to_numeric(df[col], errors="coerce")
+        bad = values.isna() & df[col].notna() & (df[col].astype(str).str.strip() != "")
+        if bad.any():
+            problems.append(f"{col} is not numeric on rows {_rows(bad)}")
+        missing = int(values.isna().sum() - bad.sum())
+        if missing:
+            warnings.append(f"{col} is empty on {missing} rows (treated as 0)")
+        low, high = (0, 100) if col in ("min_highschool_gpa", "automation_risk_score") else (0, None)
+        out = (values < low) | ((values > high) if high is not None else False)
+        if out.any():
+            problems.append(f"{col} outside [{low}, {high if high is not None else 'inf'}] on rows {_rows(out)}")
+    if not any(c in df.columns for c in subjects):
+        warnings.append("no subject weight columns: grade scores fall back to the average grade")
+
+    if problems:
+        raise CatalogError(problems)
+    return df, warnings
+
+
+# ---------- البناء ----------
+# python compiled_catalog.py majors.csv --out majors.catalog
+# الأعمدة الرقمية مصفوفات، والنصية جداول نصوص، وأعمدة القوائم عناصر مفصولة مع بداية كل صف،
+# مع جداول التقييم ومصفوفات BM25 (أرقام المصطلحات) وجداول الخيارات، ومؤشر إلى ملف متجهات الكتالوج في ذاكرة embedding_cache.
+def compile_catalog(csv_path, out_dir, **recommender_options):
+    from recommend_module import Recommender, prepare_catalog
+    raw = pd.read_csv(csv_path)
+    clean, warnings = validate(raw)
+    df = prepare_catalog(clean)
+
+    recommender = Recommender(csv_path, **recommender_options)
+    recommender._df = df
+    embeddings = recommender.embeddings
+
+    tmp = f"{out_dir.rstrip(os.sep)}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp, ignore_errors=True)
+    # full_text لا يُخزَّن: ضم للأعمدة النصية المخزنة، ولا يحتاجه التشغيل ما دامت BM25 والمتجهات مبنية
+    columns = [col for col in df.columns if col != "full_text"]
+    numeric, strings = {}, []
+    for col in columns:
+        if pd.api.types.is_numeric_dtype(df[col]):
+            numeric[col] = df[col].to_numpy()
+        else:
+            strings.append(col)
+            save_strings(tmp, f"col.{col}", df[col].tolist())
+    save_arrays(tmp, "num", numeric)
+    lists = {}
+    for col in list_cols:
+        if col in df.columns:
+            rows = [[] if pd.isna(v) else split_values(v, lower=False) for v in df[col].tolist()]
+            lists[col] = np.concatenate([[0], np.cumsum([len(r) for r in rows])]).astype(np.int64)
+            save_strings(tmp, f"list.{col}", [item for row in rows for item in row])
+    save_arrays(tmp, "lists", lists)
+    recommender.bm25.save(tmp)
+    recommender.tables.save(tmp)
+    if recommender.option_tables is not None:
+        recommender.option_tables.save(tmp)
+
+    # المتجهات لا تُنسخ: يكفي اسم الملف في الذاكرة المؤقتة (الاسم مشتق من بصمات النصوص)
+    filename = getattr(embeddings, "filename", None)
+    pointer = None
+    if filename:
+        pointer = {"model_name": recommender.model_name, "folder": os.path.basename(os.path.dirname(filename)),
+                   "file": os.path.basename(filename), "shape": list(embeddings.shape)}
+    manifest = {
+        "format": FORMAT_VERSION,
+        "source": os.path.abspath(csv_path),
+        "rows": len(df),
+        "columns": columns,
+        "numeric": list(numeric),
+        "strings": strings,
+        "lists": list(lists),
+        "tokenizer": recommender.tokenizer.__name__,
+        "boost_match": recommender.boost_match,
+        "embeddings": pointer,
+        "options": recommender.option_tables is not None,
+        "warnings": warnings,
+    }
+    save_json(tmp, "manifest", manifest)
+
+    # استبدال المجلد كاملًا: القارئ يرى النسخة القديمة أو الجديدة لا خليطًا
+    old = None
+    if os.path.exists(out_dir):
+        old = f"{out_dir.rstrip(os.sep)}.old-{os.getpid()}"
+        os.replace(out_dir, old)
+    os.replace(tmp, out_dir)
+    if old:
+        shutil.rmtree(old, ignore_errors=True)
+    return manifest
+
+
+# ---------- التحميل وقت التشغيل ----------
+def load_manifest(directory):
+    manifest = load_json(directory, "manifest")
+    if manifest.get("format") != FORMAT_VERSION:
+        raise CatalogError([f"{directory}: unsupported catalog format {manifest.get('format')!r}"])
+    return manifest
+
+
+def load_compiled(directory):
+    manifest = load_manifest(directory)
+    numeric = load_arrays(directory, "num", manifest["numeric"])
+    # كتالوج بُني قبل حذف full_text قد يحويه؛ لا يُفك
+    names = [col for col in manifest["columns"] if col != "full_text"]
+    columns = {col: numeric[col] if col in numeric else load_strings(directory, f"col.{col}") for col in names}
+    return pd.DataFrame(columns, columns=names)
+
+
+# {عمود: قائمة عناصر كل صف} لأعمدة القوائم المخزنة مفصولة
+def load_lists(directory, cols=None):
+    names = [col for col in load_manifest(directory).get("lists", []) if cols is None or col in cols]
+    offsets = load_arrays(directory, "lists", names)
+    lists = {}
+    for col in names:
+        items, bounds = load_strings(directory, f"list.{col}"), offsets[col].tolist()
+        lists[col] = [items[bounds[i]:bounds[i+1]] for i in range(len(bounds) - 1)]
+    return lists
+
+
+# يعيد المتجهات المربوطة بالذاكرة إن كانت ما زالت في الذاكرة المؤقتة وبنفس الشكل، وإلا None
+def load_embeddings(directory, cache_dir, model_name):
+    pointer = load_manifest(directory).get("embeddings")
+    if not pointer or pointer["model_name"] != model_name:
+        return None
+    path = os.path.join(cache_dir, "embeddings", pointer["folder"], pointer["file"])
+    try:
+        matrix = np.load(path, mmap_mode="r")
+    except (OSError, ValueError):
+        return None
+    return matrix if list(matrix.shape) == pointer["shape"] else None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Validate majors.csv and compile it into a memory-mapped catalog.")
+    parser.add_argument("catalog", nargs="?", default="majors.csv")
+    parser.add_argument("--out", default=None, help="output directory (default: <catalog>.catalog)")
+    parser.add_argument("--check", action="store_true", help="validate only, do not build")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.check:
+            _, warnings = validate(pd.read_csv(args.catalog))
+        else:
+            out_dir = args.out or os.path.splitext(args.catalog)[0] + ".catalog"
+            manifest = compile_catalog(args.catalog, out_dir)
+            warnings = manifest["warnings"]
+            print(f"{out_dir}: {manifest['rows']} majors, {len(manifest['columns'])} columns")
+    except CatalogError as exc:
+        print(exc, file=sys.stderr)
+        sys.exit(1)
+    for warning in warnings:
+        print(f"warning: {warning}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
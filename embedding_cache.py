@@ -0,0 +1,104 @@
+import hashlib
+import json
+import os
+import numpy as np
+
+# مجلد التخزين المؤقت على القرص (يمكن تغييره عبر متغير البيئة)
+CACHE_DIR = os.environ.get("RECOMMENDER_CACHE_DIR", ".cache")
+
+
+# ---------- مفاتيح التخزين ----------
+def text_hash(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def cache_key(model_name, text_cols):
+    raw = json.dumps({"model": model_name, "text_cols": list(text_cols)}, ensure_ascii=False)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def _read_index(folder):
+    try:
+        with open(os.path.join(folder, "index.json"), encoding="utf-8") as f:
+            index = json.load(f)
+        matrix = np.load(os.path.join(folder, index["file"]), mmap_mode="r")
+    except (OSError, ValueError, KeyError):
+        return [], None
+    if matrix.ndim != 2 or matrix.shape[0] != len(index["hashes"]):
+        return [], None
+    return index["hashes"], matrix
+
+
+def _write_index(folder, hashes, matrix):
+    os.makedirs(folder, exist_ok=True)
+    digest = hashlib.sha1("".join(hashes).encode("utf-8")).hexdigest()[:16]
+    name = f"emb-{digest}.npy"
+    tmp = os.path.join(folder, f".{name}.{os.getpid()}.tmp")
+    with open(tmp, "wb") as f:
+        np.save(f, matrix)
+    os.replace(tmp, os.path.join(folder, name))
+    tmp = os.path.join(folder, f".index.json.{os.getpid()}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"file": name, "hashes": hashes}, f)
+    # استبدال الفهرس ذرّيًا: القارئ يرى النسخة القديمة كاملة أو الجديدة كاملة
+    os.replace(tmp, os.path.join(folder, "index.json"))
+    _remove_stale(folder)
+    return name
+
+
+# لا يُحذف إلا ملف ليس ملف الفهرس الحالي وأقدم منه بأكثر من grace ثانية: ملف كتبته عملية
+# أخرى ولم تستبدل الفهرس به بعد يبقى. القارئ الذي لا يجد ملف الفهرس يعيد الترميز (_read_index).
+def _remove_stale(folder, grace=60.0):
+    try:
+        with open(os.path.join(folder, "index.json"), encoding="utf-8") as f:
+            current = json.load(f)["file"]
+        indexed = os.path.getmtime(os.path.join(folder, "index.json"))
+        names = os.listdir(folder)
+    except (OSError, ValueError, KeyError):
+        return
+    for old in names:
+        if not old.startswith("emb-") or old == current:
+            continue
+        path = os.path.join(folder, old)
+        try:
+            if os.path.getmtime(path) < indexed - grace:
+                os.remove(path)
+        except OSError:
+            pass
+
+
+# ---------- تحميل متجهات التخصصات مع إعادة الاستخدام ----------
+# يعيد مصفوفة المتجهات المطبّعة، ويرمّز فقط الصفوف الجديدة أو المعدّلة
+def load_corpus_embeddings(model, model_name, texts, text_cols, cache_dir=CACHE_DIR):
+    folder = os.path.join(cache_dir, "embeddings", cache_key(model_name, text_cols))
+    hashes = [text_hash(t) for t in texts]
+    old_hashes, old_matrix = _read_index(folder)
+    if old_matrix is not None and old_hashes == hashes:
+        return old_matrix
+
+    position = {h: i for i, h in enumerate(old_hashes)}
+    missing = {}
+    for i, h in enumerate(hashes):
+        if h not in position and h not in missing:
+            missing[h] = texts[i]
+
+    encoded = {}
+    if missing:
+        vectors = model.encode(list(missing.values()),
+                               show_progress_bar=False,
+                               convert_to_numpy=True,
+                               normalize_embeddings=True)
+        encoded = dict(zip(missing.keys(), vectors.astype(np.float32)))
+
+    dim = old_matrix.shape[1] if old_matrix is not None else (
+        len(next(iter(encoded.values()))) if encoded else model.get_sentence_embedding_dimension())
+    matrix = np.empty((len(texts), dim), dtype=np.float32)
+    for i, h in enumerate(hashes):
+        matrix[i] = old_matrix[position[h]] if h in position else encoded[h]
+
+    # القرص غير قابل للكتابة، أو حذفت عملية أخرى الملف قبل ربطه: نكمل بالمصفوفة في الذاكرة
+    try:
+        name = _write_index(folder, hashes, matrix)
+        return np.load(os.path.join(folder, name), mmap_mode="r")
+    except (OSError, ValueError):
+        return matrix
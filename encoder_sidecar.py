@@ -0,0 +1,326 @@
+import argparse
+import asyncio
+import json
+import os
+import socket
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from encoders import encoder_name, make_encoder
+
+SOCKET_PATH = os.environ.get("RECOMMENDER_ENCODER_SOCKET", "/tmp/recommender-encoder.sock")
+
+# ---------- البروتوكول ----------
+# الطلب:  طول (uint32) + JSON: {"op": "encode", "texts": [...]} أو {"op": "info"} أو {"op": "stats"}
+# الرد:   نوع (بايت) + طول (uint32) + حمولة
+#   V: عدد المتجهات وبعدها (uint32 × 2) ثم float32 خام بترتيب little-endian
+#   J: JSON (info و stats)،  E: رسالة خطأ
+REQUEST = struct.Struct("<I")
+RESPONSE = struct.Struct("<cI")
+SHAPE = struct.Struct("<II")
+
+
+def _frame(kind, payload):
+    return RESPONSE.pack(kind, len(payload)) + payload
+
+
+def _vectors_frame(vectors):
+    vectors = np.ascontiguousarray(vectors, dtype="<f4")
+    return _frame(b"V", SHAPE.pack(*vectors.shape) + vectors.tobytes())
+
+
+# ---------- تجميع طلبات كل العمليات في دفعة ترميز واحدة ----------
+class EncodeBatcher:
+    def __init__(self, encoder, max_batch_texts=256, batch_window_ms=5.0, encode_batch_size=64):
+        self.encoder = encoder
+        self.max_batch_texts = max_batch_texts
+        self.batch_window = batch_window_ms / 1000.0
+        self.encode_batch_size = encode_batch_size
+        self.queue = asyncio.Queue()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="encode")
+        self.batches = 0
+        self.requests = 0
+        self.texts = 0
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+        self.executor.shutdown(wait=False)
+
+    async def submit(self, texts):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((texts, future))
+        return await future
+
+    async def _collect(self):
+        batch = [await self.queue.get()]
+        size = len(batch[0][0])
+        deadline = time.monotonic() + self.batch_window
+        while size < self.max_batch_texts:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+            size += len(batch[-1][0])
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            # النصوص المكررة بين النسخ تُرمَّز مرة واحدة
+            unique = list(dict.fromkeys(t for texts, _ in batch for t in texts))
+            self.batches += 1
+            self.requests += len(batch)
+            self.texts += len(unique)
+            try:
+                vectors = await loop.run_in_executor(
+                    self.executor, lambda: self.encoder.encode(unique, batch_size=self.encode_batch_size))
+            except Exception as exc:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(exc)
+                continue
+            position = {t: i for i, t in enumerate(unique)}
+            for texts, future in batch:
+                if not future.done():
+                    future.set_result(vectors[[position[t] for t in texts]])
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "requests": self.requests,
+            "encoded_texts": self.texts,
+            "mean_batch_texts": self.texts / self.batches if self.batches else 0.0,
+        }
+
+
+# ---------- الخادم: عملية واحدة تملك النموذج ----------
+# python encoder_sidecar.py --socket /tmp/recommender-encoder.sock [--backend onnx]
+class EncoderSidecar:
+    def __init__(self, encoder, **batcher_options):
+        self.encoder = encoder
+        self.batcher = EncodeBatcher(encoder, **batcher_options)
+        self.info = {"name": encoder.name, "dimension": int(encoder.get_sentence_embedding_dimension())}
+
+    async def start(self, path=SOCKET_PATH):
+        if os.path.exists(path):
+            os.unlink(path)
+        self.batcher.start()
+        return await asyncio.start_unix_server(self._handle, path)
+
+    # الردود تُكتب بترتيب الطلبات، فيستطيع العميل إرسال عدة طلبات قبل قراءة أولها
+    async def _handle(self, reader, writer):
+        pending = asyncio.Queue()
+        responder = asyncio.get_running_loop().create_task(self._respond(pending, writer))
+        try:
+            while True:
+                (length,) = REQUEST.unpack(await reader.readexactly(REQUEST.size))
+                request = json.loads(await reader.readexactly(length))
+                await pending.put(asyncio.ensure_future(self._answer(request)))
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            await pending.put(None)
+            await responder
+            writer.close()
+
+    async def _answer(self, request):
+        op = request.get("op")
+        if op == "encode":
+            return _vectors_frame(await self.batcher.submit(list(request["texts"])))
+        if op == "info":
+            return _frame(b"J", json.dumps(self.info).encode("utf-8"))
+        if op == "stats":
+            return _frame(b"J", json.dumps(self.batcher.stats()).encode("utf-8"))
+        raise ValueError(f"unknown op: {op!r}")
+
+    async def _respond(self, pending, writer):
+        while True:
+            answer = await pending.get()
+            if answer is None:
+                return
+            try:
+                frame = await answer
+            except Exception as exc:
+                frame = _frame(b"E", str(exc).encode("utf-8"))
+            try:
+                writer.write(frame)
+                await writer.drain()
+            except ConnectionError:
+                return
+
+
+class SidecarError(RuntimeError):
+    pass
+
+
+# ---------- العميل: بديل مباشر للمرمّز داخل Recommender ----------
+# يرسل النصوص على دفعات متتالية دون انتظار (pipelining)، وإن تعذّر الاتصال
+# يرمّز محليًا بواجهة fallback ويعيد المحاولة مع الخادم بعد retry_after ثانية.
+class SidecarEncoder:
+    backend = "sidecar"
+
+    def __init__(self, model_name, socket_path=SOCKET_PATH, fallback="sentence-transformers",
+                 onnx_dir=None, timeout=30.0, retry_after=5.0, max_request_texts=256):
+        self.model_name = model_name
+        self.socket_path = socket_path
+        self.fallback_backend = fallback
+        self.onnx_dir = onnx_dir
+        # نفس اسم واجهة الاحتياط: المتجهات المخزنة تبقى صالحة أيًا كان من رمّزها
+        self.name = encoder_name(fallback, model_name)
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self.max_request_texts = max_request_texts
+        self.dimension = None
+        self._local = threading.local()
+        self._fallback = None
+        self._down_until = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def fallback(self):
+        if self._fallback is None:
+            with self._lock:
+                if self._fallback is None:
+                    self._fallback = make_encoder(self.fallback_backend, self.model_name, self.onnx_dir)
+        return self._fallback
+
+    # اتصال لكل خيط، مع التحقق مرة من أن الخادم يخدم نفس النموذج
+    def _connection(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(self.socket_path)
+                self._local.sock = sock
+                info = self._call(sock, [{"op": "info"}])[0]
+            except BaseException:
+                self._disconnect()
+                sock.close()
+                raise
+            if info["name"] != self.name:
+                self._disconnect()
+                raise ValueError(f"encoder sidecar serves {info['name']!r}, expected {self.name!r}")
+            self.dimension = info["dimension"]
+        return sock
+
+    def _disconnect(self):
+        sock = getattr(self._local, "sock", None)
+        self._local.sock = None
+        if sock is not None:
+            sock.close()
+
+    # تُقرأ كل الردود حتى بعد رد خطأ، فلا يبقى في الاتصال رد يقرؤه الطلب التالي؛
+    # وأي فشل آخر في منتصف القراءة يغلق الاتصال
+    def _call(self, sock, requests):
+        try:
+            replies, error = self._exchange(sock, requests)
+        except BaseException:
+            self._disconnect()
+            raise
+        if error is not None:
+            raise SidecarError(f"encoder sidecar: {error}")
+        return replies
+
+    def _exchange(self, sock, requests):
+        sock.sendall(b"".join(REQUEST.pack(len(body)) + body
+                              for body in (json.dumps(r, ensure_ascii=False).encode("utf-8") for r in requests)))
+        replies, error = [], None
+        for _ in requests:
+            kind, length = RESPONSE.unpack(_recv_exactly(sock, RESPONSE.size))
+            payload = _recv_exactly(sock, length)
+            if kind == b"E":
+                error = error or payload.decode("utf-8")
+                replies.append(None)
+            elif kind == b"J":
+                replies.append(json.loads(payload))
+            else:
+                n, dim = SHAPE.unpack_from(payload)
+                replies.append(np.frombuffer(payload, dtype="<f4", offset=SHAPE.size).reshape(n, dim))
+        return replies, error
+
+    def encode(self, texts, batch_size=64, **kwargs):
+        texts = list(texts)
+        if not texts:
+            return np.empty((0, self.get_sentence_embedding_dimension()), dtype=np.float32)
+        if time.monotonic() >= self._down_until:
+            try:
+                step = self.max_request_texts
+                requests = [{"op": "encode", "texts": texts[i:i+step]} for i in range(0, len(texts), step)]
+                return np.concatenate(self._call(self._connection(), requests))
+            except OSError:
+                self._disconnect()
+                self._down_until = time.monotonic() + self.retry_after
+            except SidecarError:
+                # الخادم يعمل لكنه فشل في هذا الطلب: يُرمَّز محليًا دون تعطيل الاتصال
+                pass
+        return self.fallback.encode(texts, batch_size=batch_size)
+
+    def get_sentence_embedding_dimension(self):
+        if self.dimension is None:
+            try:
+                self._connection()
+            except OSError:
+                return self.fallback.get_sentence_embedding_dimension()
+        return self.dimension
+
+    def stats(self):
+        return self._call(self._connection(), [{"op": "stats"}])[0]
+
+
+def _recv_exactly(sock, n):
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            raise ConnectionError("encoder sidecar closed the connection")
+        buf += chunk
+    return bytes(buf)
+
+
+async def serve(encoder, args):
+    sidecar = EncoderSidecar(encoder, max_batch_texts=args.max_batch_texts,
+                             batch_window_ms=args.batch_window_ms, encode_batch_size=args.encode_batch_size)
+    server = await sidecar.start(args.socket)
+    print(f"encoding {sidecar.info['name']} on unix:{args.socket}", flush=True)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await sidecar.batcher.stop()
+        if os.path.exists(args.socket):
+            os.unlink(args.socket)
+
+
+def main(argv=None):
+    from recommend_module import MODEL_NAME, ONNX_DIR
+    parser = argparse.ArgumentParser(description="Shared query-encoder process over a Unix socket.")
+    parser.add_argument("--socket", default=SOCKET_PATH)
+    parser.add_argument("--backend", default="sentence-transformers", choices=["sentence-transformers", "onnx", "onnx-int8"])
+    parser.add_argument("--model", default=MODEL_NAME)
+    parser.add_argument("--onnx-dir", default=ONNX_DIR)
+    parser.add_argument("--batch-window-ms", type=float, default=5.0)
+    parser.add_argument("--max-batch-texts", type=int, default=256)
+    parser.add_argument("--encode-batch-size", type=int, default=64)
+    args = parser.parse_args(argv)
+
+    encoder = make_encoder(args.backend, args.model, args.onnx_dir)
+    try:
+        asyncio.run(serve(encoder, args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+import argparse
+import json
+import os
+import numpy as np
+
+BACKENDS = ("sentence-transformers", "onnx", "onnx-int8", "sidecar")
+# الواجهة المحلية التي يعود إليها عميل sidecar إن لم تعمل العملية المشتركة
+SIDECAR_FALLBACK = os.environ.get("RECOMMENDER_SIDECAR_FALLBACK", "sentence-transformers")
+ONNX_FP32 = "model.onnx"
+ONNX_INT8 = "model.int8.onnx"
+
+
+def default_onnx_dir(model_name):
+    return os.path.join("models", model_name.replace("/", "__") + "-onnx")
+
+
+def _l2_normalize(x):
+    norms = np.linalg.norm(x, axis=1, keepdims=True)
+    return (x / np.where(norms > 0, norms, 1.0)).astype(np.float32)
+
+
+# ---------- واجهة المرمّز ----------
+# كل الواجهات تعيد متجهات float32 مطبّعة، وتقبل نفس معاملات SentenceTransformer.encode
+# حتى تبقى بديلًا مباشرًا للنموذج في ذاكرة الاستعلامات وذاكرة الكتالوج.
+# threads: خيوط torch داخل العملية (0: الافتراضي)، تُضبط عند تحميل النموذج
+class SentenceTransformerEncoder:
+    backend = "sentence-transformers"
+
+    def __init__(self, model_name, threads=0):
+        self.model_name = model_name
+        self.name = model_name
+        self.threads = threads
+        self._model = None
+
+    @property
+    def model(self):
+        if self._model is None:
+            from sentence_transformers import SentenceTransformer
+            if self.threads:
+                import torch
+                torch.set_num_threads(self.threads)
+            self._model = SentenceTransformer(self.model_name)
+        return self._model
+
+    def encode(self, texts, batch_size=64, **kwargs):
+        vectors = self.model.encode(list(texts), batch_size=batch_size, show_progress_bar=False,
+                                    convert_to_numpy=True, normalize_embeddings=True)
+        return np.asarray(vectors, dtype=np.float32)
+
+    def get_sentence_embedding_dimension(self):
+        return self.model.get_sentence_embedding_dimension()
+
+
+# ---------- ONNX Runtime على المعالج ----------
+# نفس المقطّع ونفس التجميع بالمتوسط (mean pooling) كما في النموذج الأصلي،
+# فتبقى المتجهات متوافقة مع متجهات الكتالوج المخزنة.
+class OnnxEncoder:
+    def __init__(self, model_dir, quantized=False, intra_op_threads=0):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        with open(os.path.join(model_dir, "manifest.json"), encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        self.model_name = self.manifest["model_name"]
+        self.backend = "onnx-int8" if quantized else "onnx"
+        # التكميم يغيّر المتجهات قليلًا فلا تُخلط مع متجهات fp32 في الذاكرة المؤقتة
+        self.name = self.model_name + ("@int8" if quantized else "")
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(self.manifest["max_seq_length"])
+        self.tokenizer.enable_padding(pad_id=self.manifest["pad_token_id"], pad_token=self.manifest["pad_token"])
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = intra_op_threads
+        self.session = ort.InferenceSession(os.path.join(model_dir, ONNX_INT8 if quantized else ONNX_FP32),
+                                            options, providers=["CPUExecutionProvider"])
+        self.input_names = [i.name for i in self.session.get_inputs()]
+
+    def encode(self, texts, batch_size=64, **kwargs):
+        texts = list(texts)
+        out = np.empty((len(texts), self.manifest["dimension"]), dtype=np.float32)
+        for start in range(0, len(texts), batch_size):
+            encodings = self.tokenizer.encode_batch(texts[start:start+batch_size])
+            feed = {
+                "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+                "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+                "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+            }
+            hidden = self.session.run(None, {k: feed[k] for k in self.input_names})[0]
+            mask = feed["attention_mask"][:, :, None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            out[start:start+len(encodings)] = _l2_normalize(pooled)
+        return out
+
+    def get_sentence_embedding_dimension(self):
+        return self.manifest["dimension"]
+
+
+def make_encoder(backend, model_name, onnx_dir=None, threads=0):
+    if backend == "sentence-transformers":
+        return SentenceTransformerEncoder(model_name, threads)
+    if backend in ("onnx", "onnx-int8"):
+        return OnnxEncoder(onnx_dir or default_onnx_dir(model_name), quantized=backend == "onnx-int8",
+                           intra_op_threads=threads)
+    if backend == "sidecar":
+        from encoder_sidecar import SidecarEncoder
+        return SidecarEncoder(model_name, fallback=SIDECAR_FALLBACK, onnx_dir=onnx_dir)
+    raise ValueError(f"unknown encoder backend: {backend!r} (expected one of {', '.join(BACKENDS)})")
+
+
+def encoder_name(backend, model_name):
+    if backend == "sidecar":
+        backend = SIDECAR_FALLBACK
+    return model_name + ("@int8" if backend == "onnx-int8" else "")
+
+
+# ---------- التصدير المسبق إلى ONNX ----------
+# python encoders.py export [--model NAME] [--out DIR]
+def export_onnx(model_name, out_dir, opset=17, quantize=True):
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    st = SentenceTransformer(model_name, device="cpu")
+    st.eval()
+    transformer = st[0]
+    tokenizer = transformer.tokenizer
+    os.makedirs(out_dir, exist_ok=True)
+    tokenizer.save_pretrained(out_dir)
+
+    sample = tokenizer(["export sample", "نموذج للتصدير"], padding=True, return_tensors="pt")
+    input_names = [k for k in ("input_ids", "attention_mask", "token_type_ids") if k in sample]
+
+    class _Encoder(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, *inputs):
+            return self.model(**dict(zip(input_names, inputs))).last_hidden_state
+
+    axes = {name: {0: "batch", 1: "sequence"} for name in input_names + ["last_hidden_state"]}
+    fp32_path = os.path.join(out_dir, ONNX_FP32)
+    with torch.no_grad():
+        torch.onnx.export(_Encoder(transformer.auto_model).eval(), tuple(sample[k] for k in input_names),
+                          fp32_path, input_names=input_names, output_names=["last_hidden_state"],
+                          dynamic_axes=axes, opset_version=opset, do_constant_folding=True, dynamo=False)
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(fp32_path, os.path.join(out_dir, ONNX_INT8), weight_type=QuantType.QInt8)
+
+    manifest = {
+        "model_name": model_name,
+        "dimension": st.get_sentence_embedding_dimension(),
+        "max_seq_length": st.max_seq_length,
+        "pad_token": tokenizer.pad_token,
+        "pad_token_id": tokenizer.pad_token_id,
+        "opset": opset,
+        "quantized": quantize,
+    }
+    with open(os.path.join(out_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+# مقارنة متجهات الواجهات مع المرجع على نصوص عينة
+def check_backends(model_name, onnx_dir, texts):
+    reference = SentenceTransformerEncoder(model_name).encode(texts)
+    report = {}
+    for backend in ("onnx", "onnx-int8"):
+        try:
+            vectors = make_encoder(backend, model_name, onnx_dir).encode(texts)
+        except (OSError, ValueError):
+            continue
+        report[backend] = float((reference * vectors).sum(axis=1).min())
+    return report
+
+
+def main(argv=None):
+    from recommend_module import MODEL_NAME
+    parser = argparse.ArgumentParser(description="Export and check query-encoder backends.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    export = sub.add_parser("export", help="export the model to ONNX (fp32 and dynamic int8)")
+    export.add_argument("--model", default=MODEL_NAME)
+    export.add_argument("--out", default=None)
+    export.add_argument("--opset", type=int, default=17)
+    export.add_argument("--no-quantize", action="store_true")
+    check = sub.add_parser("check", help="min cosine between each ONNX backend and sentence-transformers")
+    check.add_argument("--model", default=MODEL_NAME)
+    check.add_argument("--dir", default=None)
+    check.add_argument("--catalog", default="majors.csv")
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        out_dir = args.out or default_onnx_dir(args.model)
+        manifest = export_onnx(args.model, out_dir, args.opset, not args.no_quantize)
+        print(f"exported {manifest['model_name']} to {out_dir}")
+    else:
+        from recommend_module import load_catalog
+        texts = load_catalog(args.catalog)["name"].astype(str).tolist()
+        for backend, cosine in check_backends(args.model, args.dir or default_onnx_dir(args.model), texts).items():
+            print(f"{backend}: min cosine vs sentence-transformers = {cosine:.5f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+import re
+import threading
+from collections import OrderedDict
+import numpy as np
+from shared_arrays import load_arrays, load_json, save_arrays, save_json
+
+# نفس الفواصل التي يستخدمها app.py في extract_unique_values
+SEPARATORS = re.compile(r"[،,;؛\n]")
+
+
+# عناصر خلية قائمة بعد الفصل على الفواصل ("nan" قيمة ناقصة حُوّلت إلى نص فتُسقط).
+# lower للمطابقة دون حالة الأحرف كما في الفهرس؛ خيارات الواجهة تبقى كما كُتبت (lower=False)
+def split_values(text, lower=True):
+    values = (v.strip() for v in SEPARATORS.split(str(text)))
+    return [v.lower() if lower else v for v in values if v and v.lower() != "nan"]
+
+
+# ---------- فهرس مقلوب لحقول القوائم (job_sectors و domain) ----------
+# يُبنى مرة عند التحميل: قيمة مطبّعة -> أرقام التخصصات التي تحتويها.
+# وضع "token" يطابق القيمة كاملة، ووضع "substring" يحافظ على سلوك
+# pf.lower() in field.lower() القديم حتى لا يتغير الترتيب بصمت.
+class FacetIndex:
+    def __init__(self, values, mode="substring", memo_size=4096):
+        if mode not in ("substring", "token"):
+            raise ValueError(f"unknown match mode: {mode!r}")
+        self.mode = mode
+        self.fields = [str(v).lower() for v in values]
+        postings = {}
+        for i, field in enumerate(self.fields):
+            for token in dict.fromkeys(split_values(field)):
+                postings.setdefault(token, []).append(i)
+        self.postings = {t: np.asarray(ids) for t, ids in postings.items()}
+        self._init_memo(memo_size)
+
+    def _init_memo(self, memo_size):
+        self._empty = np.array([], dtype=int)
+        self._memo = OrderedDict()
+        self._memo_size = memo_size
+        self._lock = threading.Lock()
+
+    # القوائم المقلوبة تُحفظ متصلة (offsets + ids) لتُربط بالذاكرة دون إعادة بناء
+    def save(self, directory, prefix):
+        tokens = list(self.postings)
+        lengths = [len(self.postings[t]) for t in tokens]
+        ids = np.concatenate([self.postings[t] for t in tokens]) if tokens else np.array([], dtype=int)
+        save_arrays(directory, prefix, {"offsets": np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64),
+                                        "ids": ids.astype(np.int64)})
+        save_json(directory, prefix, {"mode": self.mode, "tokens": tokens, "fields": self.fields})
+
+    @classmethod
+    def load(cls, directory, prefix, memo_size=4096):
+        meta = load_json(directory, prefix)
+        arrays = load_arrays(directory, prefix, ("offsets", "ids"))
+        index = cls.__new__(cls)
+        index.mode = meta["mode"]
+        index.fields = meta["fields"]
+        offsets, ids = arrays["offsets"], arrays["ids"]
+        index.postings = {t: ids[offsets[i]:offsets[i+1]] for i, t in enumerate(meta["tokens"])}
+        index._init_memo(memo_size)
+        return index
+
+    def match(self, value):
+        if self.mode == "token":
+            return self.postings.get(str(value).strip().lower(), self._empty)
+        key = str(value).lower()
+        with self._lock:
+            ids = self._memo.get(key)
+            if ids is not None:
+                self._memo.move_to_end(key)
+                return ids
+        ids = self._substring_ids(key)
+        with self._lock:
+            self._memo[key] = ids
+            while len(self._memo) > self._memo_size:
+                self._memo.popitem(last=False)
+        return ids
+
+    def _substring_ids(self, key):
+        # قيمة بلا فواصل ولا مسافات طرفية لا يمكن أن تقع إلا داخل قيمة واحدة،
+        # فيكفي فحص المفردات الفريدة بدل نصوص كل التخصصات
+        if key and key == key.strip() and not SEPARATORS.search(key):
+            matched = [ids for token, ids in self.postings.items() if key in token]
+            return np.unique(np.concatenate(matched)) if matched else self._empty
+        return np.asarray([i for i, field in enumerate(self.fields) if key in field], dtype=int)
@@ -0,0 +1,78 @@
+import numpy as np
+from scipy import sparse
+from embedding_cache import CACHE_DIR, load_corpus_embeddings
+
+
+# "name=2,description=1,skills=1" -> {"name": 2.0, ...}؛ النص الفارغ يعني متجهًا واحدًا لـ full_text
+def parse_field_weights(text):
+    weights = {}
+    for part in (text or "").split(","):
+        if not part.strip():
+            continue
+        field, sep, weight = part.partition("=")
+        if not sep:
+            raise ValueError(f"field weight must be field=weight: {part.strip()!r}")
+        weights[field.strip()] = float(weight)
+    return weights or None
+
+
+# النموذج يقطع ما بعد طول تسلسله (128 رمزًا)، فالنص الطويل يُقسم على قطع من chunk_words كلمة
+def chunk_text(text, chunk_words=48):
+    words = text.split()
+    return [" ".join(words[i:i+chunk_words]) for i in range(0, len(words), chunk_words)]
+
+
+# ---------- متجهات لكل حقل في مصفوفة واحدة ----------
+# stack: (حقل × تخصص × بُعد)، متجه كل حقل متوسط متجهات قطعه مطبّعًا، فلا يُقطع شيء من النص.
+# present: (حقل × تخصص) هل للحقل نص. القطع تمر عبر ذاكرة المتجهات على القرص،
+# فلا يُرمَّز بعد التعديل إلا القطع الجديدة.
+class FieldEmbeddings:
+    def __init__(self, fields, stack, present):
+        self.fields = list(fields)
+        self.stack = stack
+        self.present = present
+
+    @classmethod
+    def build(cls, model, model_name, df, fields, cache_dir=CACHE_DIR, chunk_words=48):
+        n = len(df)
+        chunks, owners = [], []
+        for f, field in enumerate(fields):
+            values = df[field].fillna("").astype(str).tolist() if field in df.columns else [""] * n
+            for row, value in enumerate(values):
+                for chunk in chunk_text(value, chunk_words):
+                    chunks.append(chunk)
+                    owners.append(f * n + row)
+        if chunks:
+            vectors = load_corpus_embeddings(model, model_name, chunks, ("fields", chunk_words), cache_dir)
+            dim = vectors.shape[1]
+            # مجموع متجهات القطع لكل (حقل، تخصص) بضرب مصفوفة متناثرة
+            owner = sparse.csr_matrix((np.ones(len(chunks), dtype=np.float32), (owners, np.arange(len(chunks)))),
+                                      shape=(len(fields) * n, len(chunks)))
+            flat = np.asarray(owner @ np.asarray(vectors, dtype=np.float32), dtype=np.float32)
+        else:
+            dim = model.get_sentence_embedding_dimension()
+            flat = np.zeros((len(fields) * n, dim), dtype=np.float32)
+        norms = np.linalg.norm(flat, axis=1)
+        flat /= np.where(norms > 0, norms, 1.0)[:, None]
+        return cls(fields, flat.reshape(len(fields), n, dim), (norms > 0).reshape(len(fields), n))
+
+    def check(self, weights):
+        unknown = sorted(set(weights) - set(self.fields))
+        if unknown:
+            raise ValueError(f"unknown embedding fields: {unknown}")
+        if not any(w > 0 for w in weights.values()):
+            raise ValueError("field weights need at least one positive weight")
+
+    # متجه واحد لكل تخصص: مجموع متجهات الحقول الموزون مقسومًا على أوزان حقوله غير الفارغة،
+    # فحاصل ضربه مع الاستعلام متوسط موزون للتشابه الجيبي مع كل حقل
+    def combine(self, weights):
+        self.check(weights)
+        w = np.array([weights.get(field, 0.0) for field in self.fields], dtype=np.float32)
+        total = w @ self.present
+        combined = np.tensordot(w, self.stack, axes=1)
+        combined /= np.where(total > 0, total, 1.0)[:, None]
+        return combined
+
+    @property
+    def nbytes(self):
+        return self.stack.nbytes + self.present.nbytes
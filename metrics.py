@@ -0,0 +1,165 @@
+import os
+import threading
+import time
+
+METRICS_ENABLED = os.environ.get("RECOMMENDER_METRICS", "").lower() in ("1", "true", "yes")
+# حدود مدرّجات الزمن بالثواني (نفس وحدة Prometheus)
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+    def percentile(self, q):
+        # تقدير من حدود المدرّج، يكفي للوحة التشخيص
+        target = q * self.count
+        seen = 0
+        for bound, n in zip(BUCKETS, self.counts):
+            seen += n
+            if seen >= target:
+                return bound
+        return float("inf")
+
+
+# ---------- مؤقّت المراحل ----------
+# lap(stage) يضيف الزمن منذ آخر lap إلى المرحلة، فتتجمع المراحل المتكررة داخل الحلقات.
+class StageTimer:
+    __slots__ = ("metrics", "stages", "start", "last")
+
+    def __init__(self, metrics):
+        self.metrics = metrics
+        self.stages = {}
+        self.start = self.last = time.perf_counter()
+
+    def lap(self, stage):
+        now = time.perf_counter()
+        self.stages[stage] = self.stages.get(stage, 0.0) + now - self.last
+        self.last = now
+
+    def finish(self, requests):
+        total = time.perf_counter() - self.start
+        if self.metrics.enabled:
+            self.metrics.observe(self.stages, total, requests)
+        return {
+            "requests": requests,
+            "total_ms": total * 1000,
+            "stages_ms": {stage: seconds * 1000 for stage, seconds in self.stages.items()},
+        }
+
+
+# عند التعطيل وبلا تتبع: استدعاء دالة فارغة لكل مرحلة ولا شيء غير ذلك
+class _NullTimer:
+    __slots__ = ()
+
+    def lap(self, stage):
+        pass
+
+    def finish(self, requests):
+        return None
+
+
+NULL_TIMER = _NullTimer()
+
+
+# ---------- العدّادات والمدرّجات ----------
+class Metrics:
+    def __init__(self, enabled=METRICS_ENABLED, prefix="recommender"):
+        self.enabled = enabled
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = 0
+            self.batches = 0
+            self.errors = 0
+            self.batch_seconds = Histogram()
+            self.stage_seconds = {}
+
+    def timer(self, trace=False):
+        return StageTimer(self) if self.enabled or trace else NULL_TIMER
+
+    def observe(self, stages, total, requests):
+        with self._lock:
+            self.requests += requests
+            self.batches += 1
+            self.batch_seconds.observe(total)
+            for stage, seconds in stages.items():
+                histogram = self.stage_seconds.get(stage)
+                if histogram is None:
+                    histogram = self.stage_seconds[stage] = Histogram()
+                histogram.observe(seconds)
+
+    def error(self):
+        if self.enabled:
+            with self._lock:
+                self.errors += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "requests": self.requests,
+                "batches": self.batches,
+                "errors": self.errors,
+                "batch_ms": _summary(self.batch_seconds),
+                "stages_ms": {stage: _summary(h) for stage, h in self.stage_seconds.items()},
+            }
+
+    # صيغة النص التي يقرأها Prometheus؛ gauges: قيم إضافية لحظية (مثل ذاكرة الاستعلامات)
+    def to_prometheus(self, gauges=None):
+        p = self.prefix
+        lines = []
+        with self._lock:
+            for name, value, help_text in ((f"{p}_requests_total", self.requests, "Profiles scored."),
+                                           (f"{p}_batches_total", self.batches, "recommend_batch calls."),
+                                           (f"{p}_errors_total", self.errors, "Failed recommend_batch calls.")):
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter", f"{name} {value}"]
+            name = f"{p}_batch_duration_seconds"
+            lines += [f"# HELP {name} Wall time of one recommend_batch call.", f"# TYPE {name} histogram"]
+            lines += _histogram_lines(name, "", self.batch_seconds)
+            name = f"{p}_stage_duration_seconds"
+            lines += [f"# HELP {name} Time spent in each pipeline stage per batch.", f"# TYPE {name} histogram"]
+            for stage, histogram in sorted(self.stage_seconds.items()):
+                lines += _histogram_lines(name, f'stage="{stage}",', histogram)
+        for gauge, value in (gauges or {}).items():
+            lines += [f"# TYPE {p}_{gauge} gauge", f"{p}_{gauge} {value}"]
+        return "\n".join(lines) + "\n"
+
+
+def _summary(histogram):
+    if not histogram.count:
+        return {"count": 0}
+    return {
+        "count": histogram.count,
+        "mean": histogram.sum / histogram.count * 1000,
+        "p50": histogram.percentile(0.5) * 1000,
+        "p99": histogram.percentile(0.99) * 1000,
+    }
+
+
+def _histogram_lines(name, labels, histogram):
+    lines = []
+    cumulative = 0
+    for bound, n in zip(BUCKETS, histogram.counts):
+        cumulative += n
+        lines.append(f'{name}_bucket{{{labels}le="{bound}"}} {cumulative}')
+    lines.append(f'{name}_bucket{{{labels}le="+Inf"}} {histogram.count}')
+    bare = "{" + labels.rstrip(",") + "}" if labels else ""
+    lines.append(f"{name}_sum{bare} {histogram.sum}")
+    lines.append(f"{name}_count{bare} {histogram.count}")
+    return lines
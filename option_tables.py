@@ -0,0 +1,184 @@
+import numpy as np
+from scipy import sparse
+from facet_index import split_values
+from query_cache import normalize_query
+from shared_arrays import load_arrays, load_json, save_arrays, save_json
+
+# مجموعات الأعمدة التي يبني منها app.py خيارات النموذج
+option_columns = {
+    "skills": ["skills", "acquired_skills"],
+    "interests": ["interests_keywords", "core_subjects"],
+    "preferred_fields": ["domain", "name"],
+}
+
+
+# القيم المختلفة في الأعمدة بعد الفصل على الفواصل؛ هي نفسها خيارات app.py.
+# lists: عناصر أعمدة القوائم مفصولة مسبقًا (compiled_catalog.load_lists)، فلا يُفصل إلا غيرها
+def unique_values(df, cols, lists=None):
+    values = set()
+    for col in cols:
+        if lists and col in lists:
+            for items in lists[col]:
+                values.update(items)
+        elif col in df.columns:
+            for value in df[col].dropna().astype(str):
+                values.update(split_values(value, lower=False))
+    return sorted(values)
+
+
+def option_vocabulary(df, lists=None):
+    values = set()
+    for cols in option_columns.values():
+        values.update(normalize_query(v) for v in unique_values(df, cols, lists))
+    return sorted(values)
+
+
+# (خيار × كلمة): تكرار كلمات كل خيار؛ الكلمات الجديدة تُضاف إلى آخر terms
+def _count_tokens(tokenizer, options, terms):
+    position = {term: i for i, term in enumerate(terms)}
+    rows, cols = [], []
+    for row, option in enumerate(options):
+        for token in tokenizer(option):
+            rows.append(row)
+            cols.append(position.setdefault(token, len(position)))
+    terms.extend(sorted(position, key=position.get)[len(terms):])
+    return sparse.csr_matrix((np.ones(len(rows)), (rows, cols)), shape=(len(options), len(terms)))
+
+
+# field_weights: أوزان متجهات الحقول التي بُنيت منها متجهات التخصصات (field_embeddings.py)
+def storage_key(vector_store, field_weights=None):
+    components = vector_store.components
+    key = [vector_store.storage, None if components is None else len(components)]
+    return key + [field_weights] if field_weights else key
+
+
+# ---------- جداول الخيارات × التخصصات ----------
+# الخيارات مفردات مغلقة مشتقة من الكتالوج، فيُحسب مسبقًا لكل خيار متجهه وتشابهه الجيبي
+# ودرجة BM25 مع كل تخصص. الدرجتان خطيتان في الاستعلامات (مجموع موزون للمتجهات،
+# ومجموع تكرارات الكلمات في BM25)، فمساهمة الخيارات المختارة مجموع صفوف من الجداول،
+# ولا يصل إلى النموذج إلا النص الحر.
+# حدّ معروف: app.py و bench/profiles.py يبنيان about بضم الخيارات المختارة مع career_goal،
+# وهو نص حر يُرمَّز دائمًا (تضمين النص المضموم ليس مجموع تضمينات أجزائه). فملفات الواجهة
+# لا تخلو من النموذج؛ الجداول توفّر ترميز كل خيار وحده، ويبقى ترميز about و career_goal.
+# emb: (خيار × تخصص) ما دام حجمه لا يتجاوز max_cells، وإلا None ويُحسب التشابه من المتجهات.
+# encoder: اسم مرمّز الاستعلامات الذي رمّز الخيارات، فلا تُستخدم الجداول مع مرمّز آخر.
+class OptionTables:
+    def __init__(self, options, embeddings, bm25, emb=None, storage=None, encoder=None, terms=None, tokens=None):
+        self.options = options
+        self.encoder = encoder
+        self.position = {option: i for i, option in enumerate(options)}
+        self.embeddings = embeddings
+        self.bm25 = bm25
+        self.emb = emb
+        self.storage = storage
+        # tokens: (خيار × كلمة) تكرار كلمات كل خيار، والكلمات في terms؛ منها يُعاد حساب BM25
+        self.terms = terms
+        self.tokens = tokens
+
+    @classmethod
+    def build(cls, options, embeddings, bm25_index, vector_store, encoder=None, max_cells=16_000_000,
+              field_weights=None):
+        terms = []
+        tokens = _count_tokens(bm25_index.tokenizer, options, terms)
+        tables = cls(options, np.asarray(embeddings, dtype=np.float32), None, encoder=encoder,
+                     terms=terms, tokens=tokens)
+        tables.bm25 = tables._bm25_scores(bm25_index)
+        tables.rescore(vector_store, max_cells, field_weights)
+        return tables
+
+    def _bm25_scores(self, bm25_index):
+        ids = np.array([bm25_index.vocab.get(t, -1) for t in self.terms], dtype=np.int64)
+        known = np.flatnonzero(ids >= 0)
+        return sparse.csr_matrix(self.tokens[:, known] @ bm25_index.weights[ids[known]])
+
+    # جدول التشابه يتبع تمثيل متجهات التخصصات (float32 أو مكمّم أو PCA) وأوزان حقولها
+    def rescore(self, vector_store, max_cells=16_000_000, field_weights=None):
+        self.storage = storage_key(vector_store, field_weights)
+        self.emb = None
+        if len(self.options) * len(vector_store) <= max_cells and len(self.options):
+            self.emb = np.ascontiguousarray(vector_store.scores(self.embeddings).T, dtype=np.float32)
+        return self
+
+    # ---------- تحديث تزايدي ----------
+    # sources كما في BM25Index.with_documents، و vector_store نسخة CompressedVectors.with_rows
+    # (تمثيل الصف المعاد استخدامه لم يتغيّر). الخيارات القديمة تبقى، فالجدول ذاكرة لترميز
+    # الاستعلامات ولا يضر خيار اختفى من الكتالوج، وتُضاف options الجديدة بمتجهاتها embeddings.
+    # أعمدة التشابه للصفوف المعاد استخدامها تُنسخ، ولا يُحسب إلا عمود الصف الجديد وصف الخيار الجديد.
+    # أوزان BM25 تتبع IDF ومتوسط الطول على الكتالوج كله فتتغيّر كل أعمدتها، فتُعاد بضرب متناثر
+    # واحد من مصفوفة (خيار × كلمة) دون تقطيع الخيارات القديمة من جديد.
+    def with_rows(self, sources, options, embeddings, bm25_index, vector_store, max_cells=16_000_000,
+                  field_weights=None):
+        sources = np.asarray(sources, dtype=np.int64)
+        terms = list(self.terms) if self.terms is not None else []
+        old_tokens = self.tokens if self.tokens is not None else _count_tokens(
+            bm25_index.tokenizer, self.options, terms)
+        new_tokens = _count_tokens(bm25_index.tokenizer, options, terms)
+        old_tokens = old_tokens.copy()
+        old_tokens.resize((len(self.options), len(terms)))
+        tables = self.__class__(self.options + list(options),
+                                np.concatenate([self.embeddings, np.asarray(embeddings, dtype=np.float32)]),
+                                None, encoder=self.encoder, terms=terms,
+                                tokens=sparse.vstack([old_tokens, new_tokens], format="csr"))
+        tables.bm25 = tables._bm25_scores(bm25_index)
+
+        storage = storage_key(vector_store, field_weights)
+        n_options = len(tables.options)
+        if self.emb is None or self.storage != storage or n_options * len(vector_store) > max_cells:
+            return tables.rescore(vector_store, max_cells, field_weights)
+        tables.storage = storage
+        emb = np.empty((n_options, len(vector_store)), dtype=np.float32)
+        reused = sources >= 0
+        stale = np.flatnonzero(~reused)
+        old = len(self.options)
+        emb[:old, reused] = self.emb[:, sources[reused]]
+        if len(stale):
+            emb[:old, stale] = vector_store.scores(self.embeddings, rows=stale).T
+        if n_options > old:
+            emb[old:] = vector_store.scores(tables.embeddings[old:]).T
+        tables.emb = emb
+        return tables
+
+    def lookup(self, query):
+        return self.position.get(normalize_query(query))
+
+    def save(self, directory, prefix="options"):
+        arrays = {"embeddings": self.embeddings, "bm25_data": self.bm25.data,
+                  "bm25_indices": self.bm25.indices, "bm25_indptr": self.bm25.indptr}
+        if self.emb is not None:
+            arrays["emb"] = self.emb
+        if self.tokens is not None:
+            arrays.update({"tokens_data": self.tokens.data, "tokens_indices": self.tokens.indices,
+                           "tokens_indptr": self.tokens.indptr})
+        save_arrays(directory, prefix, arrays)
+        save_json(directory, prefix, {"options": self.options, "n_docs": self.bm25.shape[1],
+                                      "storage": self.storage, "emb": self.emb is not None,
+                                      "encoder": self.encoder, "terms": self.terms})
+
+    @classmethod
+    def load(cls, directory, prefix="options"):
+        meta = load_json(directory, prefix)
+        terms = meta.get("terms")
+        names = ("embeddings", "bm25_data", "bm25_indices", "bm25_indptr") + (("emb",) if meta["emb"] else ())
+        a = load_arrays(directory, prefix, names + (("tokens_data", "tokens_indices", "tokens_indptr")
+                                                    if terms is not None else ()))
+        bm25 = sparse.csr_matrix((a["bm25_data"], a["bm25_indices"], a["bm25_indptr"]),
+                                 shape=(len(meta["options"]), meta["n_docs"]), copy=False)
+        tokens = None
+        if terms is not None:
+            tokens = sparse.csr_matrix((a["tokens_data"], a["tokens_indices"], a["tokens_indptr"]),
+                                       shape=(len(meta["options"]), len(terms)), copy=False)
+        return cls(meta["options"], a["embeddings"], bm25, a.get("emb"), meta["storage"], meta["encoder"],
+                   terms, tokens)
+
+    # (ملف × خيار): عدد مرات اختيار الخيار، أو مجموع أوزان استعلاماته إن كان weighted
+    def query_matrix(self, profile_queries, option_ids, weighted=False):
+        rows, cols, values = [], [], []
+        for row, (queries, q_weights) in enumerate(profile_queries):
+            for q, w in zip(queries, q_weights):
+                option = option_ids.get(q)
+                if option is not None:
+                    rows.append(row)
+                    cols.append(option)
+                    values.append(w if weighted else 1.0)
+        return sparse.csr_matrix((np.asarray(values, dtype=np.float64), (rows, cols)),
+                                 shape=(len(profile_queries), len(self.options)))
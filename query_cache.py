@@ -0,0 +1,120 @@
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+import numpy as np
+
+
+def normalize_query(text):
+    # المرمّز يقسم على المسافات أصلًا، فتوحيدها لا يغيّر المتجه
+    return " ".join(str(text).split())
+
+
+# ---------- التخزين الدائم (اختياري) ----------
+class SqliteVectorStore:
+    def __init__(self, path):
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS query_embeddings ("
+                "model TEXT NOT NULL, text TEXT NOT NULL, vector BLOB NOT NULL, "
+                "PRIMARY KEY (model, text))")
+
+    def get_many(self, model_name, texts):
+        found = {}
+        with self._lock:
+            for start in range(0, len(texts), 500):
+                part = texts[start:start+500]
+                rows = self._conn.execute(
+                    "SELECT text, vector FROM query_embeddings WHERE model = ? AND text IN (%s)"
+                    % ",".join("?" * len(part)), [model_name, *part]).fetchall()
+                for text, blob in rows:
+                    found[text] = np.frombuffer(blob, dtype=np.float32)
+        return found
+
+    def put_many(self, model_name, items):
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO query_embeddings (model, text, vector) VALUES (?, ?, ?)",
+                [(model_name, text, np.asarray(vec, dtype=np.float32).tobytes()) for text, vec in items])
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# ---------- ذاكرة مؤقتة لمتجهات الاستعلامات ----------
+# LRU محدود داخل العملية، مدعوم بمخزن على القرص يبقى بعد إعادة التشغيل.
+# لا يصل إلى النموذج إلا ما لم يوجد في أي من الطبقتين.
+class QueryEmbeddingCache:
+    def __init__(self, model_name, max_entries=10000, path=None):
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.store = SqliteVectorStore(path) if path else None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def encode(self, model, texts, batch_size=64):
+        keys = [normalize_query(t) for t in texts]
+        vectors = {}
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                vec = self._entries.get(key)
+                if vec is not None:
+                    self._entries.move_to_end(key)
+                    vectors[key] = vec
+            self.hits += sum(1 for key in keys if key in vectors)
+
+        pending = [key for key in dict.fromkeys(keys) if key not in vectors]
+        if pending and self.store is not None:
+            found = self.store.get_many(self.model_name, pending)
+            vectors.update(found)
+            self._remember(found.items())
+            with self._lock:
+                self.disk_hits += sum(1 for key in keys if key in found)
+            pending = [key for key in pending if key not in found]
+
+        if pending:
+            encoded = model.encode(pending, batch_size=batch_size,
+                                   convert_to_numpy=True, normalize_embeddings=True)
+            encoded = [np.asarray(vec, dtype=np.float32) for vec in encoded]
+            fresh = list(zip(pending, encoded))
+            vectors.update(fresh)
+            self._remember(fresh)
+            if self.store is not None:
+                self.store.put_many(self.model_name, fresh)
+            missed = set(pending)
+            with self._lock:
+                self.misses += sum(1 for key in keys if key in missed)
+
+        return np.stack([vectors[key] for key in keys])
+
+    def _remember(self, items):
+        with self._lock:
+            for key, vec in items:
+                self._entries[key] = vec
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "size": len(self._entries),
+            "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+        }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
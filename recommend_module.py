@@ -1,10 +1,35 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from collections import OrderedDict
 import pandas as pd
 import numpy as np
-from sentence_transformers import SentenceTransformer, util
-from rank_bm25 import BM25Okapi
+from embedding_cache import CACHE_DIR, load_corpus_embeddings, text_hash
+from query_cache import QueryEmbeddingCache
+from result_cache import ResultCache
+from bm25_index import BM25Index, tokenize
+from facet_index import FacetIndex
+from vector_index import IVFIndex, default_index_path, load_or_build
+from vector_store import CompressedVectors
+from option_tables import OptionTables, option_vocabulary, storage_key
+from catalog_records import CatalogRecords
+from field_embeddings import FieldEmbeddings, parse_field_weights
+from encoders import encoder_name, make_encoder
+from metrics import Metrics, NULL_TIMER
+import compiled_catalog
+from shared_arrays import load_arrays, load_json, save_arrays, save_json
 
-# ---------- تحميل البيانات ----------
-df = pd.read_csv("majors.csv")
+MODEL_NAME = "paraphrase-multilingual-MiniLM-L12-v2"
+# واجهة ترميز الاستعلامات: sentence-transformers أو onnx أو onnx-int8،
+# أو sidecar لمشاركة نموذج واحد بين عدة عمليات (encoder_sidecar.py)
+ENCODER_BACKEND = os.environ.get("RECOMMENDER_ENCODER", "sentence-transformers")
+ONNX_DIR = os.environ.get("RECOMMENDER_ONNX_DIR")
+# خيوط مرحلة BM25 التي تعمل بالتوازي مع الترميز والتشابه الجيبي (0: في نفس الخيط)
+RETRIEVAL_THREADS = int(os.environ.get("RECOMMENDER_RETRIEVAL_THREADS", "0"))
+# أوزان متجهات الحقول، مثل "name=2,description=1,skills=1" (فارغ: متجه واحد لـ full_text)
+FIELD_WEIGHTS = parse_field_weights(os.environ.get("RECOMMENDER_FIELD_WEIGHTS"))
 
 # الأعمدة النصية
 text_cols = [
@@ -12,10 +37,6 @@ text_cols = [
     "interests_keywords","skills","acquired_skills",
     "career_paths","job_sectors","track_requirement"
 ]
-for col in text_cols:
-    if col not in df.columns:
-        df[col] = ""
-df["full_text"] = df[text_cols].fillna("").agg(" ".join, axis=1)
 
 # الأعمدة الرقمية
 num_cols = [
@@ -23,80 +44,919 @@ num_cols = [
     "holy_quran","islamic_education",
     "arabic_language","english_language","mathematics","physics","chemistry","biology"
 ]
-for col in num_cols:
-    if col not in df.columns:
-        df[col] = 0
-df[num_cols] = df[num_cols].apply(pd.to_numeric, errors="coerce").fillna(0.0)
-
-# إعداد Embeddings و BM25
-model = SentenceTransformer("paraphrase-multilingual-MiniLM-L12-v2")
-embeddings = model.encode(df["full_text"].tolist(),
-                          show_progress_bar=False,
-                          convert_to_numpy=True,
-                          normalize_embeddings=True)
-tokenized_corpus = [doc.split() for doc in df["full_text"].tolist()]
-bm25 = BM25Okapi(tokenized_corpus)
+
+
+# ---------- تحميل البيانات ----------
+# path: ملف CSV أو مجلد كتالوج مبني مسبقًا (python compiled_catalog.py majors.csv)
+def load_catalog(path="majors.csv"):
+    if compiled_catalog.is_compiled(path):
+        return compiled_catalog.load_compiled(path)
+    return prepare_catalog(pd.read_csv(path))
+
+
+def prepare_catalog(df):
+    for col in text_cols:
+        if col not in df.columns:
+            df[col] = ""
+    df["full_text"] = join_texts(df)
+    for col in num_cols:
+        if col not in df.columns:
+            df[col] = 0
+    df[num_cols] = df[num_cols].apply(pd.to_numeric, errors="coerce").fillna(0.0)
+    return df
+
+
+# الأعمدة النصية مضمومة بمسافة؛ جمع أعمدة كاملة بدل ضم كل صف وحده
+def join_texts(df):
+    cols = [df[col].fillna("").astype(str) for col in text_cols]
+    joined = cols[0]
+    for col in cols[1:]:
+        joined = joined + " " + col
+    return joined
+
+
+# نص التخصص الكامل؛ يُحسب عند الحاجة إن لم يكن في الجدول (المحرك لا يحتفظ بعمود full_text)
+def catalog_texts(df):
+    if "full_text" in df.columns:
+        return df["full_text"]
+    return join_texts(df)
+
+
+# بصمة نص كل صف: بها يُعرف الصف الذي لم يتغيّر نصه دون إعادة ضم نصوص الكتالوج
+def text_hashes(texts):
+    return np.array([text_hash(t) for t in texts], dtype="S40")
+
+
+subjects = ["arabic_language","english_language","mathematics","physics","chemistry","biology"]
+default_grade = 50.0
+
 
 # ---------- دوال مساعدة ----------
 def normalize_np(x):
     x = np.array(x, dtype=float)
+    if x.size == 0:
+        return x
     mn = x.min()
     mx = x.max()
     return np.zeros_like(x) if mx-mn < 1e-9 else (x-mn)/(mx-mn)*100
 
-# ---------- دالة التوصية ----------
-def recommend(profile, top_n=7, alpha=0.6, beta=0.35, gamma=0.1):
-    weights = {"about":1.0,"skills":1.5,"interests":1.5,"career_goal":1.7,
-               "preferred_fields":1.2,"dislikes":-0.9}
 
-    # استعلامات نصية
+# أعلى k قيمة بترتيب تنازلي في O(n + k log k)؛ عند التساوي يتقدم الأصغر فهرسًا
+def top_k(scores, k):
+    n = len(scores)
+    if k >= n:
+        return np.argsort(-scores, kind="stable")
+    if k <= 0:
+        return np.array([], dtype=int)
+    threshold = scores[np.argpartition(-scores, k-1)[:k]].min()
+    above = np.flatnonzero(scores > threshold)
+    at = np.flatnonzero(scores == threshold)[:k-len(above)]
+    chosen = np.concatenate([above, at])
+    return chosen[np.argsort(-scores[chosen], kind="stable")]
+
+
+# ---------- استعلامات الملف الشخصي ----------
+query_weights = {"about":1.0,"skills":1.5,"interests":1.5,"career_goal":1.7,
+                 "preferred_fields":1.2,"dislikes":-0.9}
+
+
+def build_queries(profile):
     queries, q_weights = [], []
-    if profile.get("about"): queries.append(profile["about"]); q_weights.append(weights["about"])
-    for s in profile.get("skills", []): queries.append(s); q_weights.append(weights["skills"])
-    for it in profile.get("interests", []): queries.append(it); q_weights.append(weights["interests"])
-    if profile.get("career_goal"): queries.append(profile["career_goal"]); q_weights.append(weights["career_goal"])
-    for pf in profile.get("preferred_fields", []): queries.append(pf); q_weights.append(weights["preferred_fields"])
-    for d in profile.get("dislikes", []): queries.append(d); q_weights.append(weights["dislikes"])
-
-    n = len(df)
-    if not queries:
-        semantic_scores = np.zeros(n)
-    else:
-        q_embeddings = model.encode(queries, convert_to_numpy=True, normalize_embeddings=True)
-        scores_emb = np.zeros(n)
-        for qv, w in zip(q_embeddings, q_weights):
-            sims = util.cos_sim(qv, embeddings)[0].numpy()
-            scores_emb += sims * w
-        scores_bm25 = np.zeros(n)
-        for q in queries:
-            scores_bm25 += bm25.get_scores(q.split())
-        semantic_scores = alpha * normalize_np(scores_emb) + (1-alpha)*normalize_np(scores_bm25)
-
-    # حساب الدرجة النهائية
-    results = []
-    subjects = ["arabic_language","english_language","mathematics","physics","chemistry","biology"]
-    default_grade = 50.0
-    autom_min, autom_max = df["automation_risk_score"].min(), df["automation_risk_score"].max()
-    study_max = df["study_duration_years"].replace(0,np.nan).max()
-    study_max = study_max if not np.isnan(study_max) else 1.0
-
-    for i, row in df.iterrows():
-        if profile.get("gpa") is not None and profile.get("gpa") < row.get("min_highschool_gpa",0):
-            continue
-        major_weights = np.array([row.get(sub,0) for sub in subjects])
-        user_grades_vec = np.array([profile.get("grades",{}).get(sub,default_grade)/100.0 for sub in subjects])
-        grade_score = ((user_grades_vec * major_weights).sum()/major_weights.sum()) if major_weights.sum()>0 else user_grades_vec.mean()
-        automation_component = (autom_max - row["automation_risk_score"])/(autom_max-autom_min)*100 if autom_max-autom_min>0 else 50
-        duration_component = (1 - row["study_duration_years"]/study_max)*100 if study_max>0 else 50
-        numeric_score = gamma*((automation_component+duration_component)/2)
-        boost = 0
-        for pf in profile.get("preferred_job_sectors", []):
-            if pf.lower() in str(row.get("job_sectors","")).lower(): boost += 8
-        for pd in profile.get("preferred_domains", []):
-            if pd.lower() in str(row.get("domain","")).lower(): boost += 6
-        sem_score = float(semantic_scores[i]) if len(semantic_scores)>i else 0
-        final_score = (1-beta)*sem_score + beta*(grade_score*100) + numeric_score + boost
-        results.append({
+    if profile.get("about"): queries.append(profile["about"]); q_weights.append(query_weights["about"])
+    for s in profile.get("skills", []): queries.append(s); q_weights.append(query_weights["skills"])
+    for it in profile.get("interests", []): queries.append(it); q_weights.append(query_weights["interests"])
+    if profile.get("career_goal"): queries.append(profile["career_goal"]); q_weights.append(query_weights["career_goal"])
+    for pf in profile.get("preferred_fields", []): queries.append(pf); q_weights.append(query_weights["preferred_fields"])
+    for d in profile.get("dislikes", []): queries.append(d); q_weights.append(query_weights["dislikes"])
+    return queries, q_weights
+
+
+# قيم track_requirement التي لا تقيّد المسار
+open_tracks = {"", "جميع المسارات"}
+
+
+# ---------- جداول التقييم المحسوبة مسبقًا ----------
+# كل ما لا يعتمد على ملف الطالب يُحسب مرة واحدة عند التحميل
+class ScoringTables:
+    def __init__(self, df, boost_match="substring"):
+        self.subject_weights = df[subjects].to_numpy(dtype=float)
+        self.subject_weight_sums = self.subject_weights.sum(axis=1)
+        self.min_gpa = df["min_highschool_gpa"].to_numpy(dtype=float)
+        # فهرس مرتب على الحد الأدنى للمعدل: المؤهلون يُحددون ببحث ثنائي قبل أي تقييم
+        self.gpa_order = np.argsort(self.min_gpa, kind="stable")
+        self.gpa_sorted = self.min_gpa[self.gpa_order]
+        # الشروط الصارمة الأخرى: التخصصات المفتوحة لكل مسار
+        tracks = df["track_requirement"].fillna("").astype(str).str.strip()
+        open_mask = tracks.isin(open_tracks).to_numpy()
+        self.track_rows = {t: np.flatnonzero(open_mask | (tracks == t).to_numpy())
+                           for t in set(tracks) - open_tracks}
+        self.open_track_rows = np.flatnonzero(open_mask)
+
+        autom = df["automation_risk_score"].to_numpy(dtype=float)
+        autom_min, autom_max = autom.min(), autom.max()
+        study = df["study_duration_years"].to_numpy(dtype=float)
+        study_max = df["study_duration_years"].replace(0,np.nan).max()
+        study_max = study_max if not np.isnan(study_max) else 1.0
+        automation_component = (autom_max - autom)/(autom_max-autom_min)*100 if autom_max-autom_min>0 else np.full(len(df), 50.0)
+        duration_component = (1 - study/study_max)*100 if study_max>0 else np.full(len(df), 50.0)
+        self.static_numeric = (automation_component+duration_component)/2
+
+        # فهارس مقلوبة للتعزيز: لا بحث نصي في الكتالوج لكل طلب
+        self.job_sectors = FacetIndex(df["job_sectors"].fillna("").tolist(), boost_match)
+        self.domains = FacetIndex(df["domain"].fillna("").tolist(), boost_match)
+
+    _arrays = ("subject_weights", "subject_weight_sums", "min_gpa", "gpa_order", "gpa_sorted",
+               "open_track_rows", "static_numeric")
+
+    def save(self, directory, prefix="tables"):
+        tracks = list(self.track_rows)
+        arrays = {name: getattr(self, name) for name in self._arrays}
+        arrays.update({f"track{i}": self.track_rows[t] for i, t in enumerate(tracks)})
+        save_arrays(directory, prefix, arrays)
+        save_json(directory, prefix, {"tracks": tracks})
+        self.job_sectors.save(directory, prefix + ".job_sectors")
+        self.domains.save(directory, prefix + ".domains")
+
+    @classmethod
+    def load(cls, directory, prefix="tables"):
+        tracks = load_json(directory, prefix)["tracks"]
+        arrays = load_arrays(directory, prefix, cls._arrays + tuple(f"track{i}" for i in range(len(tracks))))
+        tables = cls.__new__(cls)
+        for name in cls._arrays:
+            setattr(tables, name, arrays[name])
+        tables.track_rows = {t: arrays[f"track{i}"] for i, t in enumerate(tracks)}
+        tables.job_sectors = FacetIndex.load(directory, prefix + ".job_sectors")
+        tables.domains = FacetIndex.load(directory, prefix + ".domains")
+        return tables
+
+    # أرقام التخصصات المتاحة للطالب مرتبة تصاعديًا
+    def candidates(self, profile):
+        gpa = profile.get("gpa")
+        rows = None
+        if gpa is not None:
+            # float() قبل البحث: نص يُقارن بالحدود كنص، والقيمة غير الرقمية ترفع ValueError
+            rows = np.sort(self.gpa_order[:np.searchsorted(self.gpa_sorted, float(gpa), side="right")])
+        track = str(profile.get("track") or "").strip()
+        if track and track not in open_tracks:
+            allowed = self.track_rows.get(track, self.open_track_rows)
+            rows = allowed if rows is None else np.intersect1d(rows, allowed, assume_unique=True)
+        return np.arange(len(self.min_gpa)) if rows is None else rows
+
+    def grade_scores(self, grades, rows):
+        user_grades_vec = np.array([grades.get(sub,default_grade)/100.0 for sub in subjects])
+        weighted = self.subject_weights[rows] @ user_grades_vec
+        sums = self.subject_weight_sums[rows]
+        has_weights = sums > 0
+        return np.where(has_weights,
+                        weighted/np.where(has_weights, sums, 1.0),
+                        user_grades_vec.mean())
+
+    def boosts(self, profile, rows):
+        sectors = profile.get("preferred_job_sectors", [])
+        domains = profile.get("preferred_domains", [])
+        if not sectors and not domains:
+            return np.zeros(len(rows))
+        boost = np.zeros(len(self.min_gpa))
+        for pf in sectors:
+            boost[self.job_sectors.match(pf)] += 8
+        for dm in domains:
+            boost[self.domains.match(dm)] += 6
+        return boost[rows]
+
+
+def file_signature(path):
+    if compiled_catalog.is_compiled(path):
+        path = os.path.join(path, compiled_catalog.MANIFEST)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class CatalogSnapshot:
+    def __init__(self, version, records, bm25, tables, vector_store, vector_index, options=None):
+        self.version = version
+        self.records = records
+        self.bm25 = bm25
+        self.tables = tables
+        self.vector_store = vector_store
+        self.vector_index = vector_index
+        self.options = options
+
+
+
+# ---------- ناتج المرحلة الدلالية لملف واحد ----------
+# vector: متجه الملف (None إن لم تكن له استعلامات)، bm25: درجاته لكل الكتالوج،
+# emb: التشابه الجيبي لكل الكتالوج (البحث الدقيق)، ann: مرشحو الفهرس التقريبي
+class SemanticStage:
+    __slots__ = ("vector", "bm25", "emb", "ann")
+
+    def __init__(self, vector=None, bm25=None, emb=None, ann=None):
+        self.vector = vector
+        self.bm25 = bm25
+        self.emb = emb
+        self.ann = ann
+
+
+# ---------- جلسة تقييم لمستخدم واحد ----------
+# تحفظ المرحلة الدلالية لآخر max_stages مجموعات استعلامات، فتغيير الدرجات أو المعدل
+# أو المسار أو الأوزان يعيد الدمج الرقمي فقط دون ترميز أو BM25.
+class ScoringSession:
+    def __init__(self, recommender, max_stages=4):
+        self.recommender = recommender
+        self.max_stages = max_stages
+        self._stages = OrderedDict()
+        self._lock = threading.Lock()
+        self.reused = 0
+        self.computed = 0
+
+    @staticmethod
+    def key(version, profile_queries):
+        queries, q_weights = profile_queries
+        return version, tuple(queries), tuple(q_weights)
+
+    def get(self, key):
+        with self._lock:
+            stage = self._stages.get(key)
+            if stage is None:
+                return None
+            self._stages.move_to_end(key)
+            self.reused += 1
+            return stage
+
+    def put(self, key, stage):
+        with self._lock:
+            # بعد تحديث الكتالوج لا فائدة من مراحل النسخة القديمة
+            for old in [k for k in self._stages if k[0] != key[0]]:
+                del self._stages[old]
+            self._stages[key] = stage
+            self.computed += 1
+            while len(self._stages) > self.max_stages:
+                self._stages.popitem(last=False)
+
+    def recommend(self, profile, top_n=7, alpha=0.6, beta=0.35, gamma=0.1, trace=False):
+        return self.recommender.recommend(profile, top_n, alpha, beta, gamma, trace=trace, session=self)
+
+    def stats(self):
+        return {"stages": len(self._stages), "reused": self.reused, "computed": self.computed}
+
+# ---------- محرك التوصية ----------
+# لا شيء يُحمّل عند الاستيراد: البيانات والنموذج والفهارس تُبنى عند أول استخدام
+# أو عند استدعاء warm_up() صراحةً.
+class Recommender:
+    def __init__(self, catalog_path="majors.csv", model_name=MODEL_NAME, cache_dir=CACHE_DIR,
+                 query_cache_size=10000, query_cache_path=None, tokenizer=tokenize,
+                 boost_match="substring", vector_index="exact", vector_index_path=None,
+                 ann_candidates=200, nprobe=8, vector_storage="float32", pca_dim=None,
+                 encoder=ENCODER_BACKEND, onnx_dir=ONNX_DIR, metrics=None,
+                 result_cache_size=1024, result_cache_ttl=600.0, result_cache_bytes=64 << 20,
+                 option_tables=True, option_table_cells=16_000_000,
+                 retrieval_threads=RETRIEVAL_THREADS, retrieval_executor=None, encoder_threads=None,
+                 field_weights=FIELD_WEIGHTS, field_chunk_words=48):
+        self.catalog_path = catalog_path
+        self.model_name = model_name
+        # اسم واجهة أو كائن مرمّز جاهز يوفّر encode()
+        self.encoder = encoder
+        self.onnx_dir = onnx_dir
+        self.cache_dir = cache_dir
+        self.tokenizer = tokenizer
+        self.boost_match = boost_match
+        # "exact" يقارن مع كل التخصصات، و"ivf" يضيّق المرشحين بفهرس تقريبي
+        self.vector_index_kind = vector_index
+        self.vector_index_path = vector_index_path or default_index_path(catalog_path)
+        self.ann_candidates = ann_candidates
+        self.nprobe = nprobe
+        # تمثيل متجهات التخصصات في الذاكرة: float32 أو float16 أو int8، مع PCA اختياري
+        self.vector_storage = vector_storage
+        self.pca_dim = pca_dim
+        # جداول الخيارات × التخصصات: الملفات المكوّنة من خيارات النموذج وحدها لا تحتاج النموذج
+        self.use_option_tables = option_tables
+        self.option_table_cells = option_table_cells
+        # المرحلة اللفظية (BM25) على مجمّع خيوط بينما يرمّز الخيط الطالب ويحسب التشابه.
+        # خيوط النموذج تأخذ ما يبقى من الأنوية حتى لا تتزاحم معها (encoder_threads لتحديدها صراحةً).
+        self.retrieval_threads = retrieval_threads
+        if encoder_threads is None:
+            encoder_threads = max(1, (os.cpu_count() or 1) - retrieval_threads) if retrieval_threads else 0
+        self.encoder_threads = encoder_threads
+        # متجه لكل حقل نصي بدل متجه full_text الواحد، ومتجه التخصص مزيج موزون منها؛
+        # تغيير الأوزان (set_field_weights) لا يعيد ترميز الكتالوج
+        self.field_weights = dict(field_weights) if field_weights else None
+        self.field_chunk_words = field_chunk_words
+        self.query_cache = QueryEmbeddingCache(
+            encoder_name(encoder, model_name) if isinstance(encoder, str) else encoder.name,
+            query_cache_size, query_cache_path)
+        # نتائج كاملة لملفات سبق تقييمها (result_cache_size=0 لتعطيلها)
+        self.result_cache = ResultCache(result_cache_size, result_cache_ttl, result_cache_bytes)
+        # زمن كل مرحلة وعدّاداتها؛ معطّلة افتراضيًا (RECOMMENDER_METRICS=1 لتفعيلها)
+        self.metrics = metrics or Metrics()
+        self._lock = threading.RLock()
+        # يمنع تحديثين متزامنين؛ القراءة لا تنتظره
+        self._update_lock = threading.Lock()
+        self.version = 0
+        self._signature = None
+        self._watcher = None
+        self._manifest = None
+        self._df = None
+        self._records = None
+        self._text_hashes = None
+        self._model = None
+        self._embeddings = None
+        self._field_embeddings = None
+        self._bm25 = None
+        self._tables = None
+        self._vector_index = None
+        self._vector_store = None
+        self._option_tables = None
+        self._retrieval_executor = retrieval_executor
+
+    @property
+    def df(self):
+        if self._df is None:
+            with self._lock:
+                if self._df is None:
+                    self._signature = file_signature(self.catalog_path)
+                    self._df = _slim(load_catalog(self.catalog_path))
+        return self._df
+
+    @property
+    def text_hashes(self):
+        if self._text_hashes is None:
+            with self._lock:
+                if self._text_hashes is None:
+                    self._text_hashes = text_hashes(catalog_texts(self.df).tolist())
+        return self._text_hashes
+
+    # حقول العرض فقط بتمثيل مضغوط (catalog_records.py)؛ منها تُبنى النتائج
+    @property
+    def records(self):
+        if self._records is None:
+            with self._lock:
+                if self._records is None:
+                    self._records = CatalogRecords.build(self.df, result_cols)
+        return self._records
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    self._model = (make_encoder(self.encoder, self.model_name, self.onnx_dir, self.encoder_threads)
+                                   if isinstance(self.encoder, str) else self.encoder)
+        return self._model
+
+    @property
+    def embeddings(self):
+        if self._embeddings is None:
+            with self._lock:
+                if self._embeddings is None:
+                    # المتجهات محفوظة على القرص؛ لا يُعاد ترميز إلا الصفوف الجديدة أو المعدّلة.
+                    # الكتالوج يُرمَّز دائمًا بدقة كاملة حتى مع تكميم ترميز الاستعلامات.
+                    if self.field_weights:
+                        self._embeddings = self.field_embeddings.combine(self.field_weights)
+                    elif self._compiled() and self.version == 0:
+                        self._embeddings = compiled_catalog.load_embeddings(
+                            self.catalog_path, self.cache_dir, self.model_name)
+                    if self._embeddings is None:
+                        self._embeddings = load_corpus_embeddings(
+                            self._corpus_encoder(), self.model_name, catalog_texts(self.df).tolist(),
+                            text_cols, self.cache_dir)
+        return self._embeddings
+
+    @property
+    def field_embeddings(self):
+        if self._field_embeddings is None:
+            with self._lock:
+                if self._field_embeddings is None:
+                    self._field_embeddings = FieldEmbeddings.build(
+                        self._corpus_encoder(), self.model_name, self.df, text_cols,
+                        self.cache_dir, self.field_chunk_words)
+        return self._field_embeddings
+
+    # بيان الكتالوج المبني إن كان catalog_path مجلدًا مبنيًا، وإلا None
+    def _compiled(self):
+        if self._manifest is None:
+            self._manifest = (compiled_catalog.load_manifest(self.catalog_path)
+                              if compiled_catalog.is_compiled(self.catalog_path) else {})
+        return self._manifest
+
+    # عناصر أعمدة القوائم مفصولة مسبقًا في الكتالوج المبني، أو None بعد أي تحديث (تُفصل من df)
+    def catalog_lists(self, cols=None):
+        if self._compiled() and self.version == 0:
+            return compiled_catalog.load_lists(self.catalog_path, cols)
+        return None
+
+    def _corpus_encoder(self):
+        quantized = (isinstance(self.encoder, str)
+                     and encoder_name(self.encoder, self.model_name).endswith("@int8"))
+        return make_encoder("onnx", self.model_name, self.onnx_dir, self.encoder_threads) if quantized else self.model
+
+    @property
+    def bm25(self):
+        if self._bm25 is None:
+            with self._lock:
+                if self._bm25 is None:
+                    if self._compiled().get("tokenizer") == self.tokenizer.__name__:
+                        self._bm25 = BM25Index.load(self.catalog_path, tokenizer=self.tokenizer)
+                    else:
+                        self._bm25 = BM25Index(catalog_texts(self.df).tolist(), self.tokenizer)
+        return self._bm25
+
+    @property
+    def tables(self):
+        if self._tables is None:
+            with self._lock:
+                if self._tables is None:
+                    if self._compiled().get("boost_match") == self.boost_match:
+                        self._tables = ScoringTables.load(self.catalog_path)
+                    else:
+                        self._tables = ScoringTables(self.df, self.boost_match)
+        return self._tables
+
+    @property
+    def vector_index(self):
+        if self._vector_index is None:
+            with self._lock:
+                if self._vector_index is None:
+                    self._vector_index = load_or_build(self.vector_index_kind, self.embeddings,
+                                                       self.vector_index_path, self.nprobe,
+                                                       vectors=self.vector_store)
+        return self._vector_index
+
+    @property
+    def vector_store(self):
+        if self._vector_store is None:
+            with self._lock:
+                if self._vector_store is None:
+                    self._vector_store = CompressedVectors.build(self.embeddings, self.vector_storage, self.pca_dim)
+        return self._vector_store
+
+    @property
+    def retrieval_executor(self):
+        if self._retrieval_executor is None and self.retrieval_threads > 0:
+            with self._lock:
+                if self._retrieval_executor is None:
+                    self._retrieval_executor = ThreadPoolExecutor(self.retrieval_threads,
+                                                                  thread_name_prefix="retrieval")
+        return self._retrieval_executor
+
+    @property
+    def option_tables(self):
+        if self._option_tables is None and self.use_option_tables:
+            with self._lock:
+                if self._option_tables is None:
+                    tables = None
+                    if (self._compiled().get("options") and self.version == 0
+                            and self._compiled().get("tokenizer") == self.tokenizer.__name__):
+                        tables = OptionTables.load(self.catalog_path)
+                    self._option_tables = self._prepare_option_tables(tables, self.df, self.bm25, self.vector_store)
+        return self._option_tables
+
+    # جداول محفوظة بنفس المرمّز تُستخدم كما هي (مع إعادة حساب التشابه إن تغيّر تمثيل المتجهات)،
+    # وإلا تُبنى: متجهات الخيارات من ذاكرة المتجهات على القرص، فلا يُرمَّز إلا الخيار الجديد
+    def _prepare_option_tables(self, tables, df, bm25, vector_store):
+        if tables is not None and tables.encoder == self.query_cache.model_name:
+            if tables.storage != storage_key(vector_store, self.field_weights):
+                tables.rescore(vector_store, self.option_table_cells, self.field_weights)
+            return tables
+        options = tables.options if tables is not None else option_vocabulary(df, self.catalog_lists())
+        embeddings = load_corpus_embeddings(self.model, self.query_cache.model_name, options,
+                                            ("options",), self.cache_dir)
+        return OptionTables.build(options, embeddings, bm25, vector_store,
+                                  self.query_cache.model_name, self.option_table_cells, self.field_weights)
+
+    # نسخة جديدة من الكتالوج كما في _apply: النتائج المخزنة ومراحل الجلسات قُيّمت بالتمثيل القديم
+    def configure_vector_store(self, storage, pca_dim=None):
+        with self._update_lock, self._lock:
+            self.vector_storage = storage
+            self.pca_dim = pca_dim
+            self._vector_store = None
+            self._vector_index = None
+            self._option_tables = None
+            self.version += 1
+            self.result_cache.clear()
+
+    def warm_up(self):
+        self.records, self.model, self.embeddings, self.bm25, self.tables, self.vector_store, self.vector_index
+        self.option_tables
+        return self
+
+    # ---------- نسخة الكتالوج الحالية ----------
+    # كل طلب يأخذ نسخة واحدة في بدايته ويكملها عليها، فالتحديث أو إعادة التحميل
+    # لا يخلط بين جداول قديمة وجديدة في طلب جارٍ.
+    def snapshot(self):
+        with self._lock:
+            return CatalogSnapshot(self.version, self.records, self.bm25, self.tables, self.vector_store,
+                                   self.vector_index if self.vector_index_kind != "exact" else None,
+                                   self.option_tables)
+
+    # ---------- تحديث الكتالوج دون إعادة البناء ----------
+    # upserts: سجلات بمفتاح major_id؛ الموجود يُحدَّث بالحقول المعطاة فقط والجديد يُضاف في آخر الكتالوج.
+    # removals: أرقام major_id للحذف (ولها الأولوية على upserts).
+    # لا يُرمَّز ولا يُقطَّع إلا الصف الذي تغيّر نصه، والجداول الرقمية تُحسب من جديد بعمليات متجهة.
+    def update_catalog(self, upserts=(), removals=()):
+        with self._update_lock:
+            df = self.df
+            position = {mid: i for i, mid in enumerate(df["major_id"].tolist())}
+            removals = set(removals)
+            unknown = sorted(removals - set(position))
+            if unknown:
+                raise KeyError(f"unknown major_id: {unknown}")
+            removed = {position[mid] for mid in removals}
+            changed, added = {}, {}
+            for record in upserts:
+                mid = record["major_id"]
+                if mid in removals:
+                    continue
+                if mid in position:
+                    i = position[mid]
+                    changed[i] = {**(changed.get(i) or df.iloc[i].to_dict()), **record}
+                else:
+                    added[mid] = {**added.get(mid, {}), **record}
+            if not (changed or added or removed):
+                return {"added": 0, "updated": 0, "removed": 0, "encoded": 0}
+
+            # ترتيب الصفوف: الباقي في مكانه، والمعدّل مكان القديم، والجديد في الآخر
+            keep = [i for i in range(len(df)) if i not in removed and i not in changed]
+            keys = np.concatenate([keep, list(changed), len(df) + np.arange(len(added))]).astype(np.int64)
+            patch = prepare_catalog(pd.DataFrame(list(changed.values()) + list(added.values())))
+            patch_text = patch["full_text"].tolist()
+            order = np.argsort(keys, kind="stable")
+            new_df = pd.concat([df.iloc[keep], _slim(patch)], ignore_index=True).iloc[order].reset_index(drop=True)
+            origin = keys[order]
+
+            # المصدر القديم لكل صف جديد، أو -1 إن تغيّر نصه (أو كان جديدًا).
+            # لا يُضم إلا نص الصفوف المعدّلة والجديدة، ويُقارن ببصمة النص القديم
+            sources = np.where(origin < len(df), origin, -1)
+            hashes = self.text_hashes[np.where(origin < len(df), origin, 0)]
+            patch_row = {key: r for r, key in enumerate(keys[len(keep):].tolist())}
+            stale_text = {}
+            for j in np.flatnonzero(~np.isin(origin, keep)):
+                text = patch_text[patch_row[origin[j]]]
+                hashes[j] = text_hash(text)
+                if sources[j] < 0 or hashes[j] != self.text_hashes[sources[j]]:
+                    sources[j] = -1
+                    stale_text[j] = text
+            encoded = self._apply(new_df, sources, [stale_text[j] for j in np.flatnonzero(sources < 0)], hashes)
+            return {"added": len(added), "updated": len(changed), "removed": len(removed), "encoded": encoded}
+
+    # ---------- إعادة التحميل عند تغيّر الملف ----------
+    # يُقرأ الملف مرة، وكل صف نصه موجود في النسخة الحالية يأخذ متجهه ومصطلحاته منها.
+    # البناء يجري خارج القفل، ثم تُستبدل النسخة دفعة واحدة.
+    def reload(self, force=False):
+        with self._update_lock:
+            signature = file_signature(self.catalog_path)
+            if self._df is None or (signature == self._signature and not force):
+                return False
+            new_df = load_catalog(self.catalog_path)
+            new_text = catalog_texts(new_df).tolist()
+            hashes = text_hashes(new_text)
+            position = {h: i for i, h in enumerate(self.text_hashes.tolist())}
+            sources = np.array([position.get(h, -1) for h in hashes.tolist()], dtype=np.int64)
+            stale = [new_text[i] for i in np.flatnonzero(sources < 0)]
+            self._apply(_slim(new_df), sources, stale, hashes, signature)
+            return True
+
+    def watch(self, interval=2.0):
+        from catalog_watcher import CatalogWatcher
+        with self._lock:
+            if self._watcher is None:
+                self._watcher = CatalogWatcher(self, interval).start()
+        return self
+
+    # sources[i]: رقم الصف القديم الذي يُعاد استخدام متجهه ومصطلحاته للصف i، أو -1 لإعادة ترميزه.
+    # texts: نصوص الصفوف ذات المصدر -1 بترتيبها، hashes: بصمة نص كل صف في new_df
+    def _apply(self, new_df, sources, texts, hashes, signature=None):
+        stale = np.flatnonzero(sources < 0)
+        fields = None
+        if self.field_weights:
+            # قطع الحقول التي لم تتغيّر تأتي من ذاكرة المتجهات على القرص
+            fields = FieldEmbeddings.build(self._corpus_encoder(), self.model_name, new_df, text_cols,
+                                           self.cache_dir, self.field_chunk_words)
+            embeddings = fields.combine(self.field_weights)
+        else:
+            old_embeddings = self.embeddings
+            embeddings = np.empty((len(new_df), old_embeddings.shape[1]), dtype=np.float32)
+            reused = sources >= 0
+            embeddings[reused] = old_embeddings[sources[reused]]
+            if texts:
+                embeddings[stale] = self._corpus_encoder().encode(
+                    texts, show_progress_bar=False, convert_to_numpy=True, normalize_embeddings=True)
+        bm25 = self.bm25.with_documents(sources, texts)
+        tables = ScoringTables(new_df, self.boost_match)
+        records = CatalogRecords.build(new_df, result_cols)
+        vector_store = self.vector_store.with_rows(embeddings, sources)
+        vector_index = None
+        if isinstance(self._vector_index, IVFIndex):
+            vector_index = self._vector_index.with_embeddings(embeddings, vector_store)
+            try:
+                vector_index.save(self.vector_index_path)
+            except OSError:
+                pass
+        options = self.option_tables
+        if options is not None:
+            # الخيارات التي لم تكن في الجدول تأتي من الصفوف المعدّلة والجديدة وحدها
+            fresh = [v for v in option_vocabulary(new_df.iloc[stale]) if v not in options.position]
+            vectors = (self.model.encode(fresh, show_progress_bar=False, convert_to_numpy=True,
+                                         normalize_embeddings=True)
+                       if fresh else np.empty((0, options.embeddings.shape[1]), dtype=np.float32))
+            options = options.with_rows(sources, fresh, vectors, bm25, vector_store,
+                                        self.option_table_cells, self.field_weights)
+
+        with self._lock:
+            self._df, self._embeddings, self._bm25, self._tables = new_df, embeddings, bm25, tables
+            self._records, self._field_embeddings, self._text_hashes = records, fields, hashes
+            self._vector_store, self._vector_index, self._option_tables = vector_store, vector_index, options
+            if signature is not None:
+                self._signature = signature
+            self.version += 1
+            self.result_cache.clear()
+        return len(texts)
+
+    # ---------- أوزان الحقول ----------
+    # متجهات الحقول محسوبة مسبقًا، فتغيير الأوزان مزيج خطي جديد منها وإعادة بناء
+    # التمثيل المضغوط والفهرس وجدول الخيارات، بلا ترميز. يبدأ نسخة جديدة من الكتالوج.
+    def set_field_weights(self, weights):
+        weights = dict(weights)
+        with self._update_lock:
+            fields = self.field_embeddings
+            embeddings = fields.combine(weights)
+            vector_store = CompressedVectors.build(embeddings, self.vector_storage, self.pca_dim)
+            vector_index = None
+            if isinstance(self.vector_index, IVFIndex):
+                vector_index = self._vector_index.with_embeddings(embeddings, vector_store)
+                try:
+                    vector_index.save(self.vector_index_path)
+                except OSError:
+                    pass
+            options = self.option_tables
+            if options is not None:
+                # نسخة جديدة: الطلبات الجارية ما زالت تقرأ الجدول القديم
+                options = OptionTables(options.options, options.embeddings, options.bm25,
+                                       encoder=options.encoder, terms=options.terms,
+                                       tokens=options.tokens).rescore(
+                    vector_store, self.option_table_cells, weights)
+            with self._lock:
+                self.field_weights = weights
+                self._embeddings, self._vector_store = embeddings, vector_store
+                self._vector_index, self._option_tables = vector_index, options
+                self.version += 1
+                self.result_cache.clear()
+        return self
+
+    def upsert_majors(self, records):
+        return self.update_catalog(upserts=records)
+
+    def remove_majors(self, major_ids):
+        return self.update_catalog(removals=major_ids)
+
+    # ---------- نشر الفهارس للعمليات الأخرى ----------
+    # العملية الأم تبني كل شيء مرة وتكتبه ملفات .npy، والعمّال يربطونها بالذاكرة
+    # للقراءة فقط (انظر worker_pool.py) فلا تُنسخ المصفوفات في كل عملية.
+    def publish(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        save_arrays(directory, "catalog", {"embeddings": np.asarray(self.embeddings, dtype=np.float32)})
+        self.records.save(directory)
+        self.bm25.save(directory)
+        self.tables.save(directory)
+        self.vector_store.save(directory)
+        if self.option_tables is not None:
+            self.option_tables.save(directory)
+        save_json(directory, "manifest", {
+            "catalog_path": self.catalog_path, "model_name": self.model_name,
+            "encoder": self.encoder if isinstance(self.encoder, str) else getattr(self.encoder, "backend", ENCODER_BACKEND),
+            "boost_match": self.boost_match, "vector_storage": self.vector_storage, "pca_dim": self.pca_dim,
+            "vector_index": self.vector_index_kind, "vector_index_path": self.vector_index_path,
+            "ann_candidates": self.ann_candidates, "nprobe": self.nprobe,
+            "option_tables": self.use_option_tables, "option_table_cells": self.option_table_cells,
+            "field_weights": self.field_weights, "field_chunk_words": self.field_chunk_words,
+        })
+        return directory
+
+    @classmethod
+    def attach(cls, directory, **overrides):
+        options = dict(load_json(directory, "manifest"))
+        options.update(overrides)
+        catalog_path = options.pop("catalog_path")
+        recommender = cls(catalog_path, **options)
+        recommender._records = CatalogRecords.load(directory)
+        recommender._embeddings = load_arrays(directory, "catalog", ("embeddings",))["embeddings"]
+        recommender._bm25 = BM25Index.load(directory, tokenizer=overrides.get("tokenizer"))
+        recommender._tables = ScoringTables.load(directory)
+        recommender._vector_store = CompressedVectors.load(directory)
+        if recommender.use_option_tables and os.path.exists(os.path.join(directory, "options.json")):
+            recommender._option_tables = recommender._prepare_option_tables(
+                OptionTables.load(directory), None, recommender._bm25, recommender._vector_store)
+        return recommender
+
+    # ---------- دالة التوصية ----------
+    # trace=True يعيد (النتائج، زمن كل مرحلة) بدل النتائج وحدها
+    # session: جلسة من self.session() تحفظ المرحلة الدلالية لآخر ملفاتها
+    def recommend(self, profile, top_n=7, alpha=0.6, beta=0.35, gamma=0.1, trace=False, session=None):
+        if trace:
+            results, stages = self.recommend_batch([profile], top_n, alpha, beta, gamma, trace=True, session=session)
+            return results[0], stages
+        return self.recommend_batch([profile], top_n=top_n, alpha=alpha, beta=beta, gamma=gamma, session=session)[0]
+
+    def session(self, max_stages=4):
+        return ScoringSession(self, max_stages)
+
+    # ---------- واجهة غير متزامنة ----------
+    # التقييم يجري في منفّذ حلقة الأحداث الافتراضي، فلا تتوقف الحلقة أثناءه
+    async def recommend_async(self, profile, top_n=7, alpha=0.6, beta=0.35, gamma=0.1, trace=False, session=None):
+        return await asyncio.get_running_loop().run_in_executor(
+            None, partial(self.recommend, profile, top_n, alpha, beta, gamma, trace, session))
+
+    async def recommend_batch_async(self, profiles, top_n=7, alpha=0.6, beta=0.35, gamma=0.1, **kwargs):
+        return await asyncio.get_running_loop().run_in_executor(
+            None, partial(self.recommend_batch, profiles, top_n, alpha, beta, gamma, **kwargs))
+
+    # ---------- التوصية لمجموعة ملفات دفعة واحدة ----------
+    # تُجمع الاستعلامات من كل الملفات وتُزال المكررات، ثم تُرمّز دفعة واحدة
+    # ويُحسب التشابه كضرب مصفوفتين (استعلام × تخصص).
+    # الملفات الموجودة في ذاكرة النتائج لا تدخل المسار، والمتكررة في الدفعة تُقيَّم مرة.
+    def recommend_batch(self, profiles, top_n=7, alpha=0.6, beta=0.35, gamma=0.1,
+                        chunk_size=512, encode_batch_size=64, trace=False, session=None):
+        timer = self.metrics.timer(trace)
+        catalog = self.snapshot()
+        results = [None] * len(profiles)
+        pending = {}
+        if self.result_cache.enabled:
+            params = [top_n, alpha, beta, gamma]
+            for i, profile in enumerate(profiles):
+                key = self.result_cache.key(profile, catalog.version, params)
+                if key in pending:
+                    pending[key].append(i)
+                    continue
+                cached = self.result_cache.get(key)
+                if cached is None:
+                    pending[key] = [i]
+                else:
+                    results[i] = cached
+            timer.lap("result_cache")
+        else:
+            pending = {i: [i] for i in range(len(profiles))}
+        misses = [profiles[rows[0]] for rows in pending.values()]
+        scored = []
+        try:
+            for start in range(0, len(misses), chunk_size):
+                chunk = misses[start:start+chunk_size]
+                # التصفية أولًا: التقييم كله يجري على التخصصات المؤهلة فقط
+                candidates = [catalog.tables.candidates(p) for p in chunk]
+                timer.lap("filter")
+                profile_queries = [build_queries(p) for p in chunk]
+                timer.lap("queries")
+                stages = self._semantic_stages(catalog, profile_queries, encode_batch_size, timer, session)
+                for profile, rows, stage in zip(chunk, candidates, stages):
+                    rows, semantic_scores = self._fuse(catalog, stage, rows, alpha, top_n, timer)
+                    scored.append(self._rank(catalog, profile, rows, semantic_scores, top_n, beta, gamma, timer))
+        except Exception:
+            self.metrics.error()
+            raise
+        for (key, rows), result in zip(pending.items(), scored):
+            if self.result_cache.enabled:
+                self.result_cache.put(key, result)
+            results[rows[0]] = result
+            for i in rows[1:]:
+                results[i] = [dict(item) for item in result]
+        stages = timer.finish(len(profiles))
+        return (results, stages) if trace else results
+
+    # عدّادات Prometheus مع حالة ذاكرة الاستعلامات وذاكرة النتائج
+    def metrics_text(self):
+        cache = self.query_cache.stats()
+        results = self.result_cache.stats()
+        return self.metrics.to_prometheus({
+            "query_cache_hits": cache["hits"] + cache["disk_hits"],
+            "query_cache_misses": cache["misses"],
+            "query_cache_entries": cache["size"],
+            "result_cache_hits": results["hits"],
+            "result_cache_misses": results["misses"],
+            "result_cache_hit_rate": results["hit_rate"],
+            "result_cache_entries": results["size"],
+            "result_cache_bytes": results["bytes"],
+        })
+
+    # ---------- المرحلة الدلالية: تعتمد على نصوص الملف وحدها ----------
+    # ما تحفظه الجلسة من مرحلة سابقة بنفس الاستعلامات ونسخة الكتالوج لا يُحسب من جديد
+    def _semantic_stages(self, catalog, profile_queries, encode_batch_size=64, timer=NULL_TIMER, session=None):
+        keys = [ScoringSession.key(catalog.version, queries) for queries in profile_queries] if session else None
+        stages = [session.get(key) for key in keys] if session else [None] * len(profile_queries)
+        todo = [i for i, stage in enumerate(stages) if stage is None]
+        if todo:
+            computed = self._compute_stages(catalog, [profile_queries[i] for i in todo], encode_batch_size, timer)
+            for i, stage in zip(todo, computed):
+                stages[i] = stage
+                if session:
+                    session.put(keys[i], stage)
+        return stages
+
+    def _compute_stages(self, catalog, profile_queries, encode_batch_size=64, timer=NULL_TIMER):
+        unique = list(dict.fromkeys(q for queries, _ in profile_queries for q in queries))
+        if not unique:
+            return [SemanticStage() for _ in profile_queries]
+        position = {q: i for i, q in enumerate(unique)}
+
+        # متجهات الخيارات المعروفة في جداول الخيارات؛ لا يصل إلى النموذج إلا النص الحر
+        # الذي لم يوجد في ذاكرة الاستعلامات
+        options = catalog.options
+        option_ids = {q: options.lookup(q) for q in unique} if options is not None else {}
+        free = [q for q in unique if option_ids.get(q) is None]
+        # المرحلة اللفظية لا تحتاج المتجهات: تبدأ في مجمّع الخيوط قبل الترميز
+        executor = self.retrieval_executor
+        lexical = executor.submit(self._lexical_scores, catalog, profile_queries, free, option_ids) if executor else None
+        encoded = self.query_cache.encode(self.model, free, encode_batch_size) if free else None
+        timer.lap("encode")
+        free_position = {q: i for i, q in enumerate(free)}
+        q_embeddings = np.stack([encoded[free_position[q]] if q in free_position else options.embeddings[option_ids[q]]
+                                 for q in unique])
+        # المتجهات مطبّعة، فالتشابه الجيبي ضرب نقطي، ومجموع الأوزان يُدمج في متجه واحد لكل ملف
+        profile_vecs = [np.asarray(q_weights) @ q_embeddings[[position[q] for q in queries]] if queries else None
+                        for queries, q_weights in profile_queries]
+        searched = [i for i, vec in enumerate(profile_vecs) if vec is not None]
+        stacked = np.stack([profile_vecs[i] for i in searched]) if searched else None
+        # الفهرس التقريبي يعيد أقرب التخصصات لمتجه الملف، فيتقاطع لاحقًا مع المؤهلين
+        found = {}
+        if self.vector_index_kind != "exact" and searched:
+            found = dict(zip(searched, catalog.vector_index.search(stacked, self.ann_candidates)))
+            timer.lap("ann")
+
+        # البحث الدقيق: ضرب مصفوفتين واحد (تخصص × ملف) على كل الكتالوج، أو مجموع موزون من
+        # جدول الخيارات مع ضرب النص الحر وحده؛ مع الفهرس التقريبي يُحسب التشابه لاحقًا للمرشحين فقط
+        emb = {}
+        if self.vector_index_kind == "exact" and searched:
+            if options is not None and options.emb is not None:
+                table = options.query_matrix(profile_queries, option_ids, weighted=True) @ options.emb
+                with_free = [i for i in searched if any(q in free_position for q in profile_queries[i][0])]
+                if with_free:
+                    free_vecs = []
+                    for i in with_free:
+                        queries, q_weights = profile_queries[i]
+                        picked = [(position[q], w) for q, w in zip(queries, q_weights) if q in free_position]
+                        free_vecs.append(np.asarray([w for _, w in picked]) @ q_embeddings[[j for j, _ in picked]])
+                    free_scores = catalog.vector_store.scores(np.stack(free_vecs))
+                    for j, i in enumerate(with_free):
+                        table[i] += free_scores[:, j]
+                emb = {i: table[i] for i in searched}
+            else:
+                batch_scores = catalog.vector_store.scores(stacked)
+                emb = {i: batch_scores[:, j] for j, i in enumerate(searched)}
+            timer.lap("cosine")
+        # مع مجمّع الخيوط يقيس bm25 زمن الانتظار المتبقي فقط، لا زمن المرحلة كلها
+        scores_bm25 = lexical.result() if lexical else self._lexical_scores(catalog, profile_queries, free, option_ids)
+        timer.lap("bm25")
+        return [SemanticStage(profile_vecs[i], scores_bm25[i], emb.get(i), found.get(i))
+                for i in range(len(profile_queries))]
+
+    # BM25 لكل ملف: كلمات كل استعلاماته الحرة في صف واحد، ثم ضرب متناثر واحد للدفعة،
+    # ويُضاف إليه مجموع صفوف الخيارات المختارة من الجدول
+    def _lexical_scores(self, catalog, profile_queries, free, option_ids):
+        tokens = {q: self.tokenizer(q) for q in free}
+        scores_bm25 = catalog.bm25.score_matrix(
+            [[t for q in queries if q in tokens for t in tokens[q]] for queries, _ in profile_queries])
+        options = catalog.options
+        if options is not None and any(option is not None for option in option_ids.values()):
+            scores_bm25 = scores_bm25 + np.asarray(
+                (options.query_matrix(profile_queries, option_ids) @ options.bm25).todense())
+        return scores_bm25
+
+    # ---------- الدمج مع المؤهلين: رخيص ويُعاد لكل طلب ----------
+    # التطبيع على الكتالوج كله ثم أخذ صفوف المؤهلين، فلا تتغير درجة تخصص بتغيّر من حوله من المؤهلين.
+    # مع الفهرس التقريبي يُطبَّع التشابه على كل مرشحي الفهرس (أو على الكتالوج إن عدنا إلى كل المؤهلين).
+    def _fuse(self, catalog, stage, rows, alpha, top_n, timer=NULL_TIMER):
+        if stage.vector is None:
+            return rows, np.zeros(len(rows))
+        if stage.emb is not None:
+            scores_emb = normalize_np(stage.emb)[rows]
+        else:
+            narrowed = np.intersect1d(rows, stage.ann, assume_unique=True) if stage.ann is not None else rows
+            # إن لم يبقَ ما يكفي بعد شروط القبول نعود إلى كل المؤهلين
+            if stage.ann is not None and len(narrowed) >= top_n:
+                ann = np.sort(stage.ann)
+                scores_emb = normalize_np(catalog.vector_store.scores(stage.vector, ann))[np.searchsorted(ann, narrowed)]
+                rows = narrowed
+            else:
+                scores_emb = normalize_np(catalog.vector_store.scores(stage.vector))[rows]
+        timer.lap("cosine")
+        semantic = alpha * scores_emb + (1-alpha)*normalize_np(stage.bm25)[rows]
+        timer.lap("normalize")
+        return rows, semantic
+
+    def _rank(self, catalog, profile, rows, semantic_scores, top_n, beta, gamma, timer=NULL_TIMER):
+        tables = catalog.tables
+        grade_score = tables.grade_scores(profile.get("grades",{}), rows)
+        numeric_score = gamma*tables.static_numeric[rows]
+        final_score = (1-beta)*semantic_scores + beta*(grade_score*100) + numeric_score + tables.boosts(profile, rows)
+        timer.lap("numeric")
+        # اختيار جزئي لأعلى top_n بدل ترتيب القائمة كاملة
+        best = top_k(np.round(final_score, 3), top_n)
+        timer.lap("top_k")
+        results = [self._result(catalog.records[rows[i]], final_score[i]) for i in best]
+        timer.lap("materialize")
+        return results
+
+    def _result(self, row, score):
+        return {
             "major_id": row.get("major_id"),
             "name": row.get("name"),
             "domain": row.get("domain"),
@@ -104,9 +964,47 @@ def recommend(profile, top_n=7, alpha=0.6, beta=0.35, gamma=0.1):
             "study_duration_years": row.get("study_duration_years"),
             "min_highschool_gpa": row.get("min_highschool_gpa"),
             "automation_risk_score": row.get("automation_risk_score"),
-            "score": round(final_score,3),
+            "score": round(float(score),3),
             "description": row.get("description"),
             "skills_required": row.get("skills")
-        })
-    results.sort(key=lambda x: x["score"], reverse=True)
-    return results[:top_n]
+        }
+
+
+# الأعمدة التي تظهر في النتائج؛ هي وحدها ما يُحفظ في CatalogRecords ويُنشر للعمّال
+result_cols = ["major_id", "name", "domain", "job_sectors", "study_duration_years", "min_highschool_gpa",
+               "automation_risk_score", "description", "skills"]
+
+
+# الجدول الذي يحتفظ به المحرك بعد بناء الفهارس: full_text نسخة مكررة من الأعمدة النصية
+# ولا يُحتاج إليه إلا عند التحديث، فيُحسب حينها بـ catalog_texts
+def _slim(df):
+    return df.drop(columns="full_text", errors="ignore")
+
+
+# ---------- الواجهة على مستوى الوحدة ----------
+_default = None
+_default_lock = threading.Lock()
+
+
+def get_recommender():
+    global _default
+    if _default is None:
+        with _default_lock:
+            if _default is None:
+                _default = Recommender()
+    return _default
+
+
+def recommend(profile, top_n=7, alpha=0.6, beta=0.35, gamma=0.1):
+    return get_recommender().recommend(profile, top_n=top_n, alpha=alpha, beta=beta, gamma=gamma)
+
+
+def recommend_batch(profiles, top_n=7, alpha=0.6, beta=0.35, gamma=0.1):
+    return get_recommender().recommend_batch(profiles, top_n=top_n, alpha=alpha, beta=beta, gamma=gamma)
+
+
+# توافق مع الاستخدام القديم: recommend_module.df و model و embeddings و bm25
+def __getattr__(name):
+    if name in ("df", "model", "embeddings", "bm25"):
+        return getattr(get_recommender(), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
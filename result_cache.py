@@ -0,0 +1,117 @@
+import hashlib
+import json
+import sys
+import threading
+import time
+from collections import OrderedDict
+from query_cache import normalize_query
+
+
+# ---------- الصيغة الموحّدة للملف الشخصي ----------
+# ترتيب عناصر القوائم لا يغيّر النتيجة (الأوزان تُجمع والمصطلحات تُعدّ)، والمسافات
+# لا تغيّر المتجه، فالملفان المتكافئان يأخذان نفس المفتاح. الدرجات وحدها تُقرّب إلى
+# precision منزلة؛ المعدل شرط قبول صارم فيبقى بدقته الكاملة.
+def canonical_profile(value, precision=2, rounded=False):
+    if isinstance(value, dict):
+        return {str(k): canonical_profile(v, precision, rounded or k == "grades") for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        items = [canonical_profile(v, precision, rounded) for v in value]
+        return sorted(items, key=lambda v: json.dumps(v, ensure_ascii=False, sort_keys=True))
+    if isinstance(value, bool) or value is None:
+        return value
+    if isinstance(value, str):
+        return normalize_query(value)
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return normalize_query(value)
+    return round(number, precision) if rounded else number
+
+
+def profile_key(profile, version, params, precision=2):
+    body = json.dumps([canonical_profile(profile, precision), version, params],
+                      ensure_ascii=False, sort_keys=True)
+    return hashlib.blake2b(body.encode("utf-8"), digest_size=16).digest()
+
+
+# حجم تقريبي للنتيجة: القواميس ومفاتيحها وقيمها (النصوص الطويلة كالوصف هي الغالبة)
+def _size(results):
+    total = sys.getsizeof(results)
+    for item in results:
+        total += sys.getsizeof(item) + sum(sys.getsizeof(v) for v in item.values())
+    return total
+
+
+# ---------- ذاكرة مؤقتة لنتائج التوصية ----------
+# LRU مع مدة صلاحية (ttl بالثواني) وحد أعلى للذاكرة (max_bytes). المفتاح يتضمن
+# نسخة الكتالوج، فأي تحديث أو إعادة تحميل يجعل المدخلات القديمة غير قابلة للوصول،
+# ويفرغها Recommender عند تغيّر النسخة حتى لا تشغل الذاكرة.
+class ResultCache:
+    def __init__(self, max_entries=1024, ttl=600.0, max_bytes=64 << 20, precision=2):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.precision = precision
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    def key(self, profile, version, params):
+        return profile_key(profile, version, params, self.precision)
+
+    # نسخة من القوائم والقواميس: المستدعي قد يعدّل النتيجة دون أن يفسد المخزَّن
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl and now - entry[0] > self.ttl:
+                self._drop(key)
+                self.expired += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return [dict(item) for item in entry[1]]
+
+    def put(self, key, results):
+        size = _size(results)
+        if not self.enabled or size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.monotonic(), [dict(item) for item in results], size)
+            self.bytes += size
+            while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _drop(self, key):
+        self.bytes -= self._entries.pop(key)[2]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "evictions": self.evictions,
+            "size": len(self._entries),
+            "bytes": self.bytes,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
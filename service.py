@@ -0,0 +1,297 @@
+import argparse
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+import numpy as np
+
+SCORING_PARAMS = {"top_n": int, "alpha": float, "beta": float, "gamma": float}
+MAX_BODY_BYTES = 1 << 20
+
+
+class Overloaded(Exception):
+    pass
+
+
+# أنواع numpy إلى قيم بايثون، وNaN (حقول فارغة في الكتالوج) إلى null
+def _plain(value):
+    if isinstance(value, dict):
+        return {k: _plain(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_plain(v) for v in value]
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and value != value:
+        return None
+    return value
+
+
+def to_json(obj):
+    return json.dumps(_plain(obj), ensure_ascii=False).encode("utf-8")
+
+
+# ---------- التحقق من أنواع حقول الملف الشخصي ----------
+# الخطأ هنا خطأ المستخدم (400) لا خطأ التقييم: قائمة نصية تُقيَّم حرفًا حرفًا،
+# ومعدل نصي يُقارن بالحدود كنص.
+PROFILE_LISTS = ("skills", "interests", "preferred_fields", "dislikes", "preferred_job_sectors", "preferred_domains")
+PROFILE_TEXTS = ("about", "career_goal", "track")
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def validate_profile(profile):
+    if not isinstance(profile, dict):
+        raise ValueError("profile must be a JSON object")
+    for field in PROFILE_LISTS:
+        value = profile.get(field)
+        if value is not None and (not isinstance(value, list) or not all(isinstance(v, str) for v in value)):
+            raise ValueError(f"{field} must be a list of strings")
+    for field in PROFILE_TEXTS:
+        value = profile.get(field)
+        if value is not None and not isinstance(value, str):
+            raise ValueError(f"{field} must be a string")
+    if profile.get("gpa") is not None and not _is_number(profile["gpa"]):
+        raise ValueError("gpa must be a number")
+    grades = profile.get("grades")
+    if grades is not None:
+        if not isinstance(grades, dict):
+            raise ValueError("grades must be an object of subject: number")
+        for subject, grade in grades.items():
+            if not _is_number(grade):
+                raise ValueError(f"grades.{subject} must be a number")
+    return profile
+
+
+# ---------- تجميع الطلبات في دفعات صغيرة ----------
+# الطلبات التي تصل خلال batch_window_ms تُجمع (حتى max_batch_size) وتُقيَّم
+# معًا عبر recommend_batch: ترميز واحد وضرب مصفوفات واحد ثم تُوزَّع النتائج.
+class MicroBatcher:
+    def __init__(self, recommender, max_batch_size=64, batch_window_ms=10.0, max_queue=1024):
+        self.recommender = recommender
+        self.max_batch_size = max_batch_size
+        self.batch_window = batch_window_ms / 1000.0
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        # النموذج يعمل في خيط واحد خارج حلقة الأحداث
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="recommend")
+        self.batches = 0
+        self.requests = 0
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+        self.executor.shutdown(wait=False)
+
+    async def submit(self, profile, params):
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self.queue.put_nowait((profile, params, future))
+        except asyncio.QueueFull:
+            raise Overloaded()
+        return await future
+
+    async def _collect(self):
+        batch = [await self.queue.get()]
+        deadline = time.monotonic() + self.batch_window
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            self.batches += 1
+            self.requests += len(batch)
+            # معاملات التقييم المختلفة تُقيَّم في مجموعات منفصلة
+            groups = {}
+            for item in batch:
+                groups.setdefault(tuple(sorted(item[1].items())), []).append(item)
+            for params, items in groups.items():
+                profiles = [profile for profile, _, _ in items]
+                try:
+                    results = await loop.run_in_executor(
+                        self.executor, lambda: self.recommender.recommend_batch(profiles, **dict(params)))
+                except Exception:
+                    # ملف معيب لا يُسقط الدفعة: يُقيَّم كل ملف وحده فيفشل طلبه فقط
+                    results = await loop.run_in_executor(
+                        self.executor, lambda: self._one_by_one(profiles, dict(params)))
+                for (_, _, future), result in zip(items, results):
+                    if future.done():
+                        continue
+                    if isinstance(result, Exception):
+                        future.set_exception(result)
+                    else:
+                        future.set_result(result)
+
+    def _one_by_one(self, profiles, params):
+        results = []
+        for profile in profiles:
+            try:
+                results.append(self.recommender.recommend(profile, **params))
+            except Exception as exc:
+                results.append(exc)
+        return results
+
+    def stats(self):
+        return {
+            "queue_depth": self.queue.qsize(),
+            "batches": self.batches,
+            "requests": self.requests,
+            "mean_batch_size": self.requests / self.batches if self.batches else 0.0,
+        }
+
+
+# ---------- خادم HTTP/1.1 بسيط فوق asyncio ----------
+class RecommendationServer:
+    def __init__(self, recommender, max_concurrency=256, **batcher_options):
+        self.recommender = recommender
+        self.batcher = MicroBatcher(recommender, **batcher_options)
+        self.max_concurrency = max_concurrency
+        self._slots = None
+
+    async def start(self, host="127.0.0.1", port=8000, reuse_port=False):
+        self._slots = asyncio.Semaphore(self.max_concurrency)
+        self.batcher.start()
+        return await asyncio.start_server(self._handle, host, port, reuse_port=reuse_port or None)
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                method, target, headers, body = request
+                async with self._slots:
+                    status, payload = await self._dispatch(method, target, body)
+                content_type = b"application/json; charset=utf-8"
+                # /metrics يعيد نص Prometheus لا JSON
+                if isinstance(payload, str):
+                    payload, content_type = payload.encode("utf-8"), b"text/plain; version=0.0.4; charset=utf-8"
+                keep_alive = headers.get("connection", "").lower() != "close"
+                writer.write(b"HTTP/1.1 %d %s\r\nContent-Type: %s\r\n"
+                             b"Content-Length: %d\r\nConnection: %s\r\n\r\n"
+                             % (status, _REASONS.get(status, b"OK"), content_type, len(payload),
+                                b"keep-alive" if keep_alive else b"close"))
+                writer.write(payload)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader):
+        line = await reader.readline()
+        if not line:
+            return None
+        method, target, _ = line.decode("latin-1").split(" ", 2)
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        length = int(headers.get("content-length", 0))
+        if length > MAX_BODY_BYTES:
+            raise ValueError("request body too large")
+        body = await reader.readexactly(length) if length else b""
+        return method, target, headers, body
+
+    async def _dispatch(self, method, target, body):
+        url = urlsplit(target)
+        if url.path == "/health" and method == "GET":
+            return 200, to_json({"status": "ok"})
+        if url.path == "/stats" and method == "GET":
+            stats = self.batcher.stats()
+            stats["query_cache"] = self.recommender.query_cache.stats()
+            stats["result_cache"] = self.recommender.result_cache.stats()
+            stats["catalog_version"] = self.recommender.version
+            stats["stages"] = self.recommender.metrics.snapshot()
+            return 200, to_json(stats)
+        if url.path == "/metrics" and method == "GET":
+            return 200, self.recommender.metrics_text()
+        if url.path != "/recommend":
+            return 404, to_json({"error": "not found"})
+        if method != "POST":
+            return 405, to_json({"error": "use POST"})
+        try:
+            profile = validate_profile(json.loads(body or b"{}"))
+            query = parse_qs(url.query)
+            params = {k: cast(query[k][0]) for k, cast in SCORING_PARAMS.items() if k in query}
+        except ValueError as exc:
+            return 400, to_json({"error": str(exc)})
+        try:
+            results = await self.batcher.submit(profile, params)
+        except Overloaded:
+            return 503, to_json({"error": "queue full, retry later"})
+        except Exception as exc:
+            return 500, to_json({"error": str(exc)})
+        return 200, to_json({"results": results})
+
+
+_REASONS = {200: b"OK", 400: b"Bad Request", 404: b"Not Found", 405: b"Method Not Allowed",
+            500: b"Internal Server Error", 503: b"Service Unavailable"}
+
+
+# python service.py --port 8000 --batch-window-ms 10 --max-batch-size 64
+def build_parser():
+    parser = argparse.ArgumentParser(description="HTTP JSON recommendation service with micro-batching.")
+    parser.add_argument("--catalog", default="majors.csv")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--batch-window-ms", type=float, default=10.0)
+    parser.add_argument("--max-batch-size", type=int, default=64)
+    parser.add_argument("--max-queue", type=int, default=1024)
+    parser.add_argument("--max-concurrency", type=int, default=256)
+    parser.add_argument("--metrics", action="store_true", help="record per-stage timings for /metrics")
+    parser.add_argument("--watch", type=float, default=0.0,
+                        help="reload the catalog when the file changes, polling every N seconds")
+    parser.add_argument("--retrieval-threads", type=int, default=None,
+                        help="threads scoring BM25 alongside query encoding (0: same thread)")
+    return parser
+
+
+async def serve(recommender, args, reuse_port=False):
+    server = RecommendationServer(recommender, max_concurrency=args.max_concurrency,
+                                  max_batch_size=args.max_batch_size,
+                                  batch_window_ms=args.batch_window_ms, max_queue=args.max_queue)
+    listener = await server.start(args.host, args.port, reuse_port)
+    print(f"serving on http://{args.host}:{args.port}/recommend", flush=True)
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        await server.batcher.stop()
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    from recommend_module import Recommender
+    options = {} if args.retrieval_threads is None else {"retrieval_threads": args.retrieval_threads}
+    recommender = Recommender(args.catalog, **options).warm_up()
+    recommender.metrics.enabled = args.metrics or recommender.metrics.enabled
+    if args.watch > 0:
+        recommender.watch(args.watch)
+    try:
+        asyncio.run(serve(recommender, args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+import json
+import os
+import numpy as np
+
+
+# ---------- حفظ المصفوفات وتحميلها بالربط مع الذاكرة ----------
+# الملفات تُفتح للقراءة فقط بـ mmap، فتتشارك العمليات نفس الصفحات دون نسخ.
+def save_arrays(directory, prefix, arrays):
+    os.makedirs(directory, exist_ok=True)
+    for name, array in arrays.items():
+        np.save(os.path.join(directory, f"{prefix}.{name}.npy"), np.ascontiguousarray(array))
+
+
+def load_arrays(directory, prefix, names):
+    return {name: np.load(os.path.join(directory, f"{prefix}.{name}.npy"), mmap_mode="r")
+            for name in names}
+
+
+def save_json(directory, name, data):
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, f"{name}.json"), "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+
+
+def load_json(directory, name):
+    with open(os.path.join(directory, f"{name}.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+
+# ---------- جدول نصوص ----------
+# كل عمود نصي يُخزَّن نصًا واحدًا بترميز UTF-8 مع مواضع البداية (بعدد المحارف)،
+# فيُفك العمود كله باستدعاء decode واحد ثم تقطيع.
+def save_strings(directory, prefix, values):
+    nulls = np.array([v is None or (isinstance(v, float) and v != v) for v in values], dtype=bool)
+    texts = ["" if null else str(v) for v, null in zip(values, nulls)]
+    offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+    np.cumsum([len(t) for t in texts], out=offsets[1:])
+    data = np.frombuffer("".join(texts).encode("utf-8"), dtype=np.uint8)
+    save_arrays(directory, prefix, {"data": data, "offsets": offsets, "nulls": nulls})
+
+
+def load_strings(directory, prefix):
+    arrays = load_arrays(directory, prefix, ("data", "offsets", "nulls"))
+    text = arrays["data"].tobytes().decode("utf-8")
+    offsets = arrays["offsets"].tolist()
+    return [None if null else text[offsets[i]:offsets[i+1]] for i, null in enumerate(arrays["nulls"].tolist())]
@@ -0,0 +1,156 @@
+import argparse
+import hashlib
+import os
+import numpy as np
+
+
+def embeddings_fingerprint(embeddings):
+    return hashlib.sha1(np.ascontiguousarray(embeddings, dtype=np.float32).tobytes()).hexdigest()
+
+
+def default_index_path(catalog_path, kind="ivf"):
+    return os.path.splitext(catalog_path)[0] + f".{kind}.npz"
+
+
+# يقبل مصفوفة عادية أو CompressedVectors من vector_store
+def _scores(vectors, vec, rows=None):
+    if hasattr(vectors, "scores"):
+        return vectors.scores(vec, rows)
+    return np.asarray(vectors if rows is None else vectors[rows]) @ vec
+
+
+def _top_ids(scores, ids, k):
+    if len(ids) > k:
+        part = np.argpartition(-scores, k-1)[:k]
+        ids, scores = ids[part], scores[part]
+    return ids[np.argsort(-scores, kind="stable")]
+
+
+# ---------- البحث الدقيق (السلوك الحالي) ----------
+class ExactIndex:
+    kind = "exact"
+
+    def __init__(self, vectors):
+        self.vectors = vectors
+
+    def search(self, vectors, k):
+        ids = np.arange(len(self.vectors))
+        return [_top_ids(_scores(self.vectors, vec), ids, k) for vec in np.atleast_2d(vectors)]
+
+
+# ---------- فهرس تقريبي IVF (عناقيد k-means مع فحص nprobe عنقودًا) ----------
+# nlist: عدد العناقيد، nprobe: عدد العناقيد المفحوصة لكل استعلام.
+# زيادة nprobe ترفع الاستدعاء على حساب السرعة؛ nprobe = nlist يعادل البحث الدقيق.
+class IVFIndex:
+    kind = "ivf"
+
+    def __init__(self, vectors, centroids, list_offsets, list_ids, nprobe=8, fingerprint=""):
+        self.vectors = vectors
+        self.centroids = centroids
+        self.list_offsets = list_offsets
+        self.list_ids = list_ids
+        self.nprobe = nprobe
+        self.fingerprint = fingerprint
+
+    @classmethod
+    def build(cls, embeddings, nlist=None, n_iter=20, nprobe=8, seed=0):
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        n = len(matrix)
+        nlist = max(1, min(nlist or int(np.sqrt(n)), n))
+        rng = np.random.default_rng(seed)
+        centroids = matrix[rng.choice(n, nlist, replace=False)].copy()
+        for _ in range(n_iter):
+            assign = np.argmax(matrix @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, matrix)
+            counts = np.bincount(assign, minlength=nlist)
+            empty = counts == 0
+            # العناقيد الفارغة تُعاد تهيئتها بنقاط عشوائية
+            sums[empty] = matrix[rng.choice(n, int(empty.sum()))]
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            centroids = sums / np.where(norms > 0, norms, 1.0)
+        return cls._assign(embeddings, centroids.astype(np.float32), nprobe)
+
+    @classmethod
+    def _assign(cls, embeddings, centroids, nprobe):
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        assign = np.argmax(matrix @ centroids.T, axis=1)
+        order = np.argsort(assign, kind="stable")
+        list_offsets = np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=len(centroids)))])
+        return cls(embeddings, centroids, list_offsets, order, nprobe, embeddings_fingerprint(matrix))
+
+    # بعد تعديل الكتالوج: نفس العناقيد، وتُوزَّع المتجهات عليها من جديد بلا k-means
+    def with_embeddings(self, embeddings, vectors=None):
+        index = self._assign(embeddings, self.centroids, self.nprobe)
+        if vectors is not None:
+            index.vectors = vectors
+        return index
+
+    def search(self, vectors, k):
+        vectors = np.atleast_2d(vectors)
+        nprobe = min(self.nprobe, len(self.centroids))
+        probes = np.argsort(-(vectors @ self.centroids.T), axis=1)[:, :nprobe]
+        results = []
+        for vec, lists in zip(vectors, probes):
+            ids = np.concatenate([self.list_ids[self.list_offsets[c]:self.list_offsets[c+1]] for c in lists])
+            results.append(_top_ids(_scores(self.vectors, vec, ids), ids, k))
+        return results
+
+    def save(self, path):
+        tmp = path + ".tmp.npz"
+        np.savez(tmp, centroids=self.centroids, list_offsets=self.list_offsets,
+                 list_ids=self.list_ids, fingerprint=np.array(self.fingerprint))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path, embeddings, nprobe=8, vectors=None):
+        with np.load(path) as data:
+            fingerprint = str(data["fingerprint"])
+            if fingerprint != embeddings_fingerprint(embeddings):
+                raise ValueError(f"{path} was built for a different embedding matrix")
+            return cls(embeddings if vectors is None else vectors, data["centroids"],
+                       data["list_offsets"], data["list_ids"], nprobe, fingerprint)
+
+
+# vectors: ما يُقيَّم عليه البحث (قد يكون مضغوطًا)، والبناء دائمًا من float32
+def load_or_build(kind, embeddings, path=None, nprobe=8, nlist=None, vectors=None):
+    if kind == "exact":
+        return ExactIndex(embeddings if vectors is None else vectors)
+    if kind != "ivf":
+        raise ValueError(f"unknown vector index: {kind!r}")
+    if path and os.path.exists(path):
+        try:
+            return IVFIndex.load(path, embeddings, nprobe, vectors)
+        except (ValueError, OSError, KeyError):
+            pass
+    index = IVFIndex.build(embeddings, nlist=nlist, nprobe=nprobe)
+    if path:
+        try:
+            index.save(path)
+        except OSError:
+            pass
+    if vectors is not None:
+        index.vectors = vectors
+    return index
+
+
+# ---------- البناء المسبق خارج الخادم ----------
+# python vector_index.py majors.csv --nlist 256
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build an IVF index next to the majors catalog.")
+    parser.add_argument("catalog", nargs="?", default="majors.csv")
+    parser.add_argument("--nlist", type=int, default=None)
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args(argv)
+
+    from recommend_module import Recommender
+    embeddings = Recommender(args.catalog).embeddings
+    index = IVFIndex.build(embeddings, nlist=args.nlist, n_iter=args.iterations)
+    path = args.output or default_index_path(args.catalog)
+    index.save(path)
+    print(f"{path}: {len(embeddings)} vectors in {len(index.centroids)} lists")
+
+
+if __name__ == "__main__":
+    main()
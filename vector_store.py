@@ -0,0 +1,173 @@
+import argparse
+import json
+import sys
+import numpy as np
+from shared_arrays import load_arrays, load_json, save_arrays, save_json
+
+STORAGES = ("float32", "float16", "int8")
+
+
+# ---------- تخزين مضغوط لمتجهات التخصصات ----------
+# float32: المصفوفة كما هي (بلا نسخ)، float16: نصف الحجم،
+# int8: ربع الحجم مع معامل قياس لكل متجه.
+# pca_dim اختياري: إسقاط على أهم المكونات الرئيسية المحسوبة من الكتالوج نفسه.
+class CompressedVectors:
+    def __init__(self, data, scales=None, mean=None, components=None, storage="float32"):
+        self.data = data
+        self.scales = scales
+        self.mean = mean
+        self.components = components
+        self.storage = storage
+
+    @classmethod
+    def build(cls, embeddings, storage="float32", pca_dim=None):
+        if storage not in STORAGES:
+            raise ValueError(f"unknown vector storage: {storage!r}")
+        mean = components = None
+        if pca_dim:
+            matrix = np.asarray(embeddings, dtype=np.float32)
+            mean = matrix.mean(axis=0)
+            _, _, vt = np.linalg.svd(matrix - mean, full_matrices=False)
+            components = np.ascontiguousarray(vt[:pca_dim], dtype=np.float32)
+        vectors = cls(None, None, mean, components, storage)
+        vectors.data, vectors.scales = vectors._compress(embeddings)
+        return vectors
+
+    # الإسقاط على المكونات (إن وُجدت) ثم التحويل إلى صيغة التخزين؛ كل صف مستقل عن غيره
+    def _compress(self, embeddings):
+        matrix = embeddings
+        if self.components is not None:
+            matrix = (np.asarray(embeddings, dtype=np.float32) - self.mean) @ self.components.T
+        if self.storage == "float32":
+            return matrix, None
+        if self.storage == "float16":
+            return np.asarray(matrix, dtype=np.float16), None
+        matrix = np.asarray(matrix, dtype=np.float32)
+        scales = np.abs(matrix).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        return np.round(matrix / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+
+    # ---------- تحديث تزايدي ----------
+    # sources[i]: الصف القديم الذي لم يتغيّر متجهه فيُنسخ تمثيله للصف i، أو -1 لصف يُضغط من embeddings[i].
+    # المكونات الرئيسية تبقى كما حُسبت، فلا يُعاد PCA ولا يُضغط إلا الصف الجديد أو المعدّل.
+    def with_rows(self, embeddings, sources):
+        if self.storage == "float32" and self.components is None:
+            return self.__class__(embeddings, storage=self.storage)
+        sources = np.asarray(sources, dtype=np.int64)
+        reused = sources >= 0
+        stale = np.flatnonzero(~reused)
+        fresh, fresh_scales = self._compress(np.asarray(embeddings)[stale])
+        data = np.empty((len(sources),) + self.data.shape[1:], dtype=self.data.dtype)
+        data[reused] = self.data[sources[reused]]
+        data[stale] = fresh
+        scales = None
+        if self.scales is not None:
+            scales = np.empty(len(sources), dtype=np.float32)
+            scales[reused] = self.scales[sources[reused]]
+            scales[stale] = fresh_scales
+        return self.__class__(data, scales, self.mean, self.components, self.storage)
+
+    def __len__(self):
+        return len(self.data)
+
+    def save(self, directory, prefix="vectors"):
+        parts = {"scales": self.scales, "mean": self.mean, "components": self.components}
+        arrays = {"data": self.data, **{k: v for k, v in parts.items() if v is not None}}
+        save_arrays(directory, prefix, arrays)
+        save_json(directory, prefix, {"storage": self.storage, "arrays": list(arrays)})
+
+    @classmethod
+    def load(cls, directory, prefix="vectors"):
+        meta = load_json(directory, prefix)
+        arrays = load_arrays(directory, prefix, meta["arrays"])
+        return cls(arrays["data"], arrays.get("scales"), arrays.get("mean"), arrays.get("components"),
+                   meta["storage"])
+
+    @property
+    def nbytes(self):
+        extra = sum(a.nbytes for a in (self.scales, self.mean, self.components) if a is not None)
+        return self.data.nbytes + extra
+
+    # حاصل الضرب النقطي مع متجه استعلام (n,) أو مع عدة متجهات (p × d) فيعيد (n × p)،
+    # على دفعات حتى لا تُفك المصفوفة كاملة في الذاكرة
+    def scores(self, vec, rows=None, chunk=8192):
+        vec = np.asarray(vec)
+        many = vec.ndim == 2
+        cols = vec.T if many else vec
+        offset = 0.0
+        if self.components is not None:
+            offset = self.mean @ cols
+            cols = self.components @ cols
+        if self.storage != "float32":
+            cols = cols.astype(np.float32)
+        data = self.data if rows is None else self.data[rows]
+        if self.storage == "float32":
+            out = np.asarray(data) @ cols
+        else:
+            out = np.empty((len(data),) + cols.shape[1:], dtype=np.float32)
+            for start in range(0, len(data), chunk):
+                out[start:start+chunk] = data[start:start+chunk].astype(np.float32) @ cols
+        if self.scales is not None:
+            scales = self.scales if rows is None else self.scales[rows]
+            out *= scales[:, None] if many else scales
+        return out + offset
+
+
+# ---------- تقرير المقارنة مع float32 ----------
+# python vector_store.py --profiles profiles.jsonl [--k 7] [--json report.json]
+def read_profiles(path):
+    stream = sys.stdin if path == "-" else open(path, encoding="utf-8")
+    with stream:
+        return [json.loads(line) for line in stream if line.strip()]
+
+
+def compare_storages(recommender, profiles, configs, top_n=7):
+    recommender.configure_vector_store("float32", None)
+    reference = [[r["major_id"] for r in res] for res in recommender.recommend_batch(profiles, top_n=top_n)]
+    baseline_bytes = recommender.vector_store.nbytes
+    report = []
+    for storage, pca_dim in configs:
+        recommender.configure_vector_store(storage, pca_dim)
+        got = [[r["major_id"] for r in res] for res in recommender.recommend_batch(profiles, top_n=top_n)]
+        overlaps = [len(set(a) & set(b)) / len(a) if a else 1.0 for a, b in zip(reference, got)]
+        report.append({
+            "storage": storage,
+            "pca_dim": pca_dim,
+            "bytes": int(recommender.vector_store.nbytes),
+            "ratio": recommender.vector_store.nbytes / baseline_bytes,
+            "mean_overlap": float(np.mean(overlaps)),
+            "min_overlap": float(np.min(overlaps)),
+            "same_order": float(np.mean([a == b for a, b in zip(reference, got)])),
+        })
+    recommender.configure_vector_store("float32", None)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare compressed catalog vectors against float32.")
+    parser.add_argument("--catalog", default="majors.csv")
+    parser.add_argument("--profiles", required=True, help="JSONL file with one profile per line, or -")
+    parser.add_argument("--k", type=int, default=7)
+    parser.add_argument("--pca", type=int, nargs="*", default=[256, 128, 64])
+    parser.add_argument("--json", default=None, help="also write the report to this file")
+    args = parser.parse_args(argv)
+
+    from recommend_module import Recommender
+    recommender = Recommender(args.catalog).warm_up()
+    profiles = read_profiles(args.profiles)
+    dims = [d for d in args.pca if d < recommender.embeddings.shape[1]]
+    configs = [(s, None) for s in STORAGES[1:]] + [(s, d) for d in dims for s in STORAGES]
+    report = compare_storages(recommender, profiles, configs, args.k)
+
+    print(f"{len(profiles)} profiles, top-{args.k}, float32 = {recommender.vector_store.nbytes/2**20:.2f} MiB")
+    print(f"{'storage':<8} {'pca':>5} {'MiB':>8} {'ratio':>6} {'overlap':>8} {'min':>6} {'order':>6}")
+    for row in report:
+        print(f"{row['storage']:<8} {row['pca_dim'] or '-':>5} {row['bytes']/2**20:>8.2f} {row['ratio']:>6.2f} "
+              f"{row['mean_overlap']:>8.3f} {row['min_overlap']:>6.2f} {row['same_order']:>6.2f}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
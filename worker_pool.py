@@ -0,0 +1,150 @@
+import asyncio
+import multiprocessing as mp
+import os
+import shutil
+import sys
+import tempfile
+from collections import deque
+from recommend_module import Recommender
+
+
+# /dev/shm إن وُجد حتى تبقى الملفات المنشورة في الذاكرة لا على القرص
+def default_shared_dir():
+    root = "/dev/shm" if os.path.isdir("/dev/shm") else None
+    return tempfile.mkdtemp(prefix="recommender-", dir=root)
+
+
+def _context(start_method=None):
+    if start_method:
+        return mp.get_context(start_method)
+    return mp.get_context("fork" if "fork" in mp.get_all_start_methods() else "spawn")
+
+
+# ---------- عامل واحد: يربط الفهارس المنشورة ويحمّل النموذج فقط ----------
+_worker = None
+
+
+def _attach_worker(directory, overrides, torch_threads):
+    global _worker
+    _worker = Recommender.attach(directory, **overrides).warm_up()
+    # كل عامل يأخذ نواة: خيوط torch الافتراضية تتزاحم حين تعمل عدة عمليات معًا
+    if torch_threads and "torch" in sys.modules:
+        sys.modules["torch"].set_num_threads(torch_threads)
+
+
+# إن فشلت الدفعة يُقيَّم كل ملف وحده، والفاشل يعود استثناءً في مكانه بدل إسقاط الدفعة كلها
+def _recommend_chunk(task):
+    profiles, params = task
+    try:
+        return _worker.recommend_batch(profiles, **params)
+    except Exception:
+        results = []
+        for profile in profiles:
+            try:
+                results.append(_worker.recommend(profile, **params))
+            except Exception as exc:
+                results.append(exc)
+        return results
+
+
+# ---------- مجموعة عمّال تتقاسم كتالوجًا واحدًا ----------
+# العملية الأم تبني الكتالوج (أو تستخدم Recommender جاهزًا) وتنشره مرة،
+# ثم يرتبط كل عامل بنفس الملفات للقراءة فقط: لا DataFrame كامل ولا نسخ للمصفوفات.
+class WorkerPool:
+    def __init__(self, recommender=None, workers=None, directory=None, chunk_size=64,
+                 torch_threads=1, start_method=None, **overrides):
+        recommender = recommender or Recommender(**overrides)
+        self._owns_directory = directory is None
+        self.directory = recommender.publish(directory or default_shared_dir())
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self._pool = _context(start_method).Pool(
+            self.workers, initializer=_attach_worker,
+            initargs=(self.directory, overrides, torch_threads))
+
+    def recommend_batch(self, profiles, chunk_size=None, **params):
+        results = list(self.imap(profiles, chunk_size, **params))
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+        return results
+
+    # نتائج متدفقة بنفس ترتيب الملفات الشخصية، والملف الفاشل يظهر استثناءً في مكانه. لا يُرسل أكثر من max_pending دفعة
+    # قبل استلام نتائجها، فلا يُقرأ المدخل كله إلى الذاكرة (Pool.imap يستهلكه دفعة واحدة).
+    def imap(self, profiles, chunk_size=None, max_pending=None, **params):
+        chunk_size = chunk_size or self.chunk_size
+        max_pending = max_pending or 2 * self.workers
+        pending = deque()
+        for chunk in _chunks(profiles, chunk_size):
+            pending.append(self._pool.apply_async(_recommend_chunk, ((chunk, params),)))
+            if len(pending) >= max_pending:
+                yield from pending.popleft().get()
+        while pending:
+            yield from pending.popleft().get()
+
+    def close(self):
+        self._pool.close()
+        self._pool.join()
+        if self._owns_directory:
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _chunks(items, size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# ---------- خدمة HTTP بعدة عمليات على نفس المنفذ ----------
+# python worker_pool.py --workers 4 --port 8000
+# كل عامل يشغّل service.serve بـ SO_REUSEPORT فتوزّع النواة الاتصالات بينهم.
+def _serve_worker(directory, args):
+    import service
+    options = {} if args.retrieval_threads is None else {"retrieval_threads": args.retrieval_threads}
+    _attach_worker(directory, options, args.torch_threads)
+    _worker.metrics.enabled = args.metrics or _worker.metrics.enabled
+    try:
+        asyncio.run(service.serve(_worker, args, reuse_port=True))
+    except KeyboardInterrupt:
+        pass
+
+
+def main(argv=None):
+    import service
+    parser = service.build_parser()
+    parser.description = "Multi-process recommendation service sharing one published catalog."
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--shared-dir", default=None, help="where to publish the catalog (default: /dev/shm)")
+    parser.add_argument("--torch-threads", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    directory = Recommender(args.catalog).publish(args.shared_dir or default_shared_dir())
+    ctx = _context()
+    processes = [ctx.Process(target=_serve_worker, args=(directory, args), daemon=True)
+                 for _ in range(args.workers)]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+    finally:
+        if args.shared_dir is None:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()